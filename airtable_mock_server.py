@@ -0,0 +1,135 @@
+"""Локальный mock-сервер Airtable API для проверки интеграции без реального Airtable.
+
+Поддерживает создание записей (POST /v0/<base>/<table>) с проверкой лимитов
+Airtable: не больше 10 записей в запросе и не больше 5 запросов в секунду
+(при превышении - ответ 429). Записи хранятся в памяти и доступны через
+GET /v0/<base>/<table>.
+
+Запуск:
+    python airtable_mock_server.py --port 8089
+    AIRTABLE_API_URL=http://127.0.0.1:8089/v0 python run.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_RECORDS_PER_REQUEST = 10
+
+
+class MockAirtableState:
+    """Записи и учет частоты запросов mock-сервера"""
+
+    def __init__(self, rate_limit=5, retry_after=None):
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.records = {}
+        self.requests = []
+        self.throttled = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.throttled += 1
+                return False
+            self._recent.append(now)
+            return True
+
+    def add_records(self, table, records):
+        created = []
+        with self._lock:
+            for record in records:
+                item = {
+                    'id': 'rec' + uuid.uuid4().hex[:14],
+                    'createdTime': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+                    'fields': record.get('fields', {})
+                }
+                self.records.setdefault(table, []).append(item)
+                created.append(item)
+        return created
+
+
+def make_handler(state):
+    class MockAirtableHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _table(self):
+            parts = self.path.split('?')[0].strip('/').split('/')
+            if len(parts) != 3 or parts[0] != 'v0':
+                return None
+            return f'{parts[1]}/{parts[2]}'
+
+        def do_GET(self):
+            table = self._table()
+            if table is None:
+                return self._send(404, {'error': 'NOT_FOUND'})
+            self._send(200, {'records': state.records.get(table, [])})
+
+        def do_POST(self):
+            table = self._table()
+            if table is None:
+                return self._send(404, {'error': 'NOT_FOUND'})
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self._send(401, {'error': 'AUTHENTICATION_REQUIRED'})
+            if not state.allow_request():
+                headers = {'Retry-After': str(state.retry_after)} if state.retry_after is not None else None
+                return self._send(429, {'errors': [{'error': 'RATE_LIMIT_REACHED'}]}, headers)
+
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            state.requests.append(payload)
+
+            if 'records' in payload:
+                records = payload['records']
+                if len(records) > MAX_RECORDS_PER_REQUEST:
+                    return self._send(422, {'error': {'type': 'INVALID_RECORDS', 'message': 'Too many records'}})
+                return self._send(200, {'records': state.add_records(table, records)})
+
+            created = state.add_records(table, [payload])
+            self._send(200, created[0])
+
+    return MockAirtableHandler
+
+
+def start_mock_server(port=0, rate_limit=5, retry_after=None):
+    """Запустить mock-сервер в фоновом потоке; возвращает (server, state, base_url)"""
+    state = MockAirtableState(rate_limit=rate_limit, retry_after=retry_after)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, state, f'http://127.0.0.1:{server.server_address[1]}/v0'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mock-сервер Airtable API')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--rate-limit', type=int, default=5)
+    parser.add_argument('--retry-after', type=float, default=None)
+    args = parser.parse_args()
+
+    server, state, base_url = start_mock_server(args.port, args.rate_limit, args.retry_after)
+    print(f"Mock Airtable API: {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
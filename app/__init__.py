@@ -1,25 +1,35 @@
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, g, has_request_context
 import sqlite3
 import os
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
+import threading
 from flask_cors import CORS
 
 # Загрузка переменных окружения
 from dotenv import load_dotenv
 load_dotenv()
 
+# Модули ниже читают настройки из окружения при импорте
+from app.db_pool import ConnectionPool
+from app.db_tuning import apply_connection_pragmas, apply_startup_pragmas
+from app.schema_migrations import apply_migrations
+from app.availability_calendar import availability_calendar
+from app import outbox
+from app.google_clients import google_clients
+
 # Получаем абсолютный путь к директории проекта
 basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
-# Путь к БД SQLite
-db_path = os.path.join(basedir, 'instance', 'zamok.db')
+# Путь к БД SQLite (DB_PATH - для нагрузочных скриптов на отдельной БД)
+db_path = os.getenv('DB_PATH') or os.path.join(basedir, 'instance', 'zamok.db')
 
 # Функция для подключения к БД
 def get_db_connection():
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    apply_connection_pragmas(conn)
     return conn
 
 # Функция для инициализации БД (создание таблиц если не существуют)
@@ -30,6 +40,9 @@ def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # Включаем WAL и прочие настройки хранилища, сохраняемые в файле БД
+    apply_startup_pragmas(conn)
+    
     # Создаем необходимые таблицы, если они не существуют
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -98,6 +111,13 @@ def init_db():
     ''')
     
     conn.commit()
+    
+    # Индексы, триггеры и прочие изменения схемы
+    apply_migrations(conn)
+    
+    # Строим календари занятости квартир из таблицы бронирований
+    availability_calendar.rebuild(conn)
+    
     conn.close()
 
 # Инициализация Flask приложения
@@ -111,7 +131,8 @@ app = Flask(__name__,
 CORS(app)
 
 # Настройка приложения
-app.config['DEBUG'] = True
+# Режим отладки только для разработки: в продакшне приложение обслуживает gunicorn (gunicorn.conf.py)
+app.config['DEBUG'] = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG', '0') == '1'
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # отключаем кэширование статики
 
 # Добавляем дополнительную папку для статических файлов
@@ -121,11 +142,45 @@ def custom_static(filename):
 
 # Конфигурация приложения
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))
+app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', 30))
+app.config['DB_HEALTH_CHECK_INTERVAL'] = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', 30))
+
+# Пул соединений с БД: каждый поток переиспользует долгоживущее соединение
+db_pool = ConnectionPool(
+    db_path,
+    pool_size=app.config['DB_POOL_SIZE'],
+    timeout=app.config['DB_POOL_TIMEOUT'],
+    health_check_interval=app.config['DB_HEALTH_CHECK_INTERVAL'],
+    on_connect=apply_connection_pragmas
+)
+
+def get_pooled_connection():
+    """Контекст соединения из пула; внутри HTTP-запроса соединение закрепляется за запросом"""
+    if has_request_context() and not g.get('db_connection_pinned'):
+        db_pool.acquire()
+        g.db_connection_pinned = True
+    return db_pool.connection()
+
+@app.before_request
+def start_background_workers():
+    """Фоновая доставка outbox и прогрев клиентов Google запускаются в каждом процессе-воркере при первом запросе"""
+    # Если сервер не вызвал startup() (flask run, другой WSGI-сервер), инициализируемся здесь
+    if not _started:
+        startup()
+    outbox.dispatcher.start()
+    google_clients.start_warm_up()
+
+@app.teardown_request
+def release_db_connection(exc):
+    """Возвращаем соединение запроса в пул"""
+    if g.pop('db_connection_pinned', False):
+        db_pool.release()
 
 # Настройка логирования
 def setup_logging():
-    # Создаем папку для логов, если её нет
-    logs_dir = os.path.join(basedir, 'logs')
+    # Создаем папку для логов, если её нет (LOG_DIR - для скриптов на временной БД)
+    logs_dir = os.getenv('LOG_DIR') or os.path.join(basedir, 'logs')
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
     
@@ -158,11 +213,24 @@ def setup_logging():
     app.logger.info('Zamok started')
     app.logger.info(f'Environment: {os.getenv("FLASK_ENV", "production")}')
 
-# Вызываем настройку логирования
-setup_logging()
+_startup_lock = threading.Lock()
+_started = False
+
+def startup():
+    """Инициализация процесса: логирование и схема БД (выполняется один раз).
 
-# Инициализируем БД
-init_db()
+    Импорт пакета app не создает файлов и не обращается к БД - это делает
+    явный вызов при запуске: run.py, gunicorn.conf.py (в мастер-процессе до
+    запуска воркеров) и скрипты. Воркеры, созданные fork, наследуют
+    выполненную инициализацию.
+    """
+    global _started
+    with _startup_lock:
+        if _started:
+            return
+        setup_logging()
+        init_db()
+        _started = True
 
-# Импорт маршрутов
-from app import routes 
\ No newline at end of file
+# Импорт маршрутов (auth - вход, регистрация, статус верификации)
+from app import routes, auth 
\ No newline at end of file
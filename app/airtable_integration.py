@@ -1,7 +1,11 @@
 import os
 import logging
+import threading
+import time
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
@@ -11,6 +15,18 @@ load_dotenv()
 AIRTABLE_API_KEY = os.environ.get("AIRTABLE_API_KEY")
 AIRTABLE_BASE_ID = os.environ.get("AIRTABLE_BASE_ID")
 AIRTABLE_TABLE_NAME = os.environ.get("AIRTABLE_TABLE_NAME")
+# Адрес API можно переопределить для локального mock-сервера (airtable_mock_server.py)
+AIRTABLE_API_URL = os.environ.get("AIRTABLE_API_URL", "https://api.airtable.com/v0")
+
+# Ограничения Airtable API: 5 запросов в секунду на базу и 10 записей в запросе
+# (частота по умолчанию взята с небольшим запасом)
+AIRTABLE_RATE_LIMIT = float(os.environ.get("AIRTABLE_RATE_LIMIT", 4.5))
+AIRTABLE_MAX_RECORDS_PER_REQUEST = 10
+# Повторы внутри одного запроса; дальнейшие повторы выполняет outbox
+AIRTABLE_MAX_RETRIES = int(os.environ.get("AIRTABLE_MAX_RETRIES", 2))
+AIRTABLE_TIMEOUT = float(os.environ.get("AIRTABLE_TIMEOUT", 10))
+# Airtable требует подождать 30 секунд после 429, если не указан Retry-After
+AIRTABLE_THROTTLE_WAIT = float(os.environ.get("AIRTABLE_THROTTLE_WAIT", 30))
 
 # Проверка наличия параметров
 if not AIRTABLE_API_KEY:
@@ -22,71 +38,193 @@ if not AIRTABLE_TABLE_NAME:
 
 logger = logging.getLogger(__name__)
 
+
+class AirtableError(Exception):
+    """Ошибка при работе с Airtable API; status - HTTP-статус ответа (None, если ответа не было)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов (token bucket)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Дождаться токена для одного запроса"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Не выдавать токены указанное время (после ответа 429)"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+            self._updated = time.monotonic()
+
+
+def retry_after_seconds(value):
+    """Пауза из заголовка Retry-After (секунды или HTTP-дата); без заголовка - AIRTABLE_THROTTLE_WAIT"""
+    if not value:
+        return AIRTABLE_THROTTLE_WAIT
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return AIRTABLE_THROTTLE_WAIT
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AirtableClient:
+    """Клиент Airtable с пулом соединений, пачками записей и учетом лимитов"""
+
+    def __init__(self, api_key, base_id, table_name, api_url=AIRTABLE_API_URL,
+                 rate_limit=AIRTABLE_RATE_LIMIT, max_retries=AIRTABLE_MAX_RETRIES, timeout=AIRTABLE_TIMEOUT):
+        self.url = f"{api_url.rstrip('/')}/{base_id}/{table_name}"
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # Без начального запаса токенов: запросы равномерно, не больше rate_limit в секунду
+        self.limiter = TokenBucket(rate_limit, capacity=1)
+
+        # Одна сессия на процесс: соединения TCP/TLS переиспользуются
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def _post(self, payload):
+        """POST создания записей; повтор - только если Airtable точно не выполнил запрос.
+
+        Повторяются ошибки соединения, 429 и 503. После таймаута чтения или
+        другого 5xx записи могли быть созданы, и повтор продублировал бы их.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.ConnectTimeout) as e:
+                if attempt >= self.max_retries:
+                    raise AirtableError(f"Airtable недоступен: {e}") from e
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            except requests.RequestException as e:
+                raise AirtableError(f"Ошибка запроса к Airtable: {e}") from e
+
+            if response.status_code == 429:
+                wait = retry_after_seconds(response.headers.get('Retry-After'))
+                logger.warning(f"Airtable ограничил частоту запросов, пауза {wait:.0f} с")
+                self.limiter.pause(wait)
+                if attempt >= self.max_retries:
+                    break
+                continue
+
+            if response.status_code == 503 and attempt < self.max_retries:
+                logger.warning("Airtable временно недоступен (503), повтор")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            if not response.ok:
+                raise AirtableError(f"Airtable вернул {response.status_code}: {response.text}", response.status_code)
+            return response.json()
+
+        raise AirtableError("Превышено число повторов запроса к Airtable", 429)
+
+    def create_records(self, fields_list):
+        """Создать записи; запросы отправляются пачками по 10 записей"""
+        created = []
+        for start in range(0, len(fields_list), AIRTABLE_MAX_RECORDS_PER_REQUEST):
+            chunk = fields_list[start:start + AIRTABLE_MAX_RECORDS_PER_REQUEST]
+            result = self._post({"records": [{"fields": fields} for fields in chunk]})
+            created.extend(result.get("records", []))
+        return created
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_airtable_client():
+    """Клиент Airtable процесса (создается при первом обращении)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AirtableClient(AIRTABLE_API_KEY, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+        return _client
+
+
+def build_booking_fields(booking_data):
+    """Поля записи Airtable для бронирования"""
+    # Получаем текущую дату и время для записи, если нет в booking_data
+    current_time = datetime.now().strftime("%d.%m.%Y %H:%M")
+
+    # Преобразуем ID бронирования в число, если это строка
+    booking_id = booking_data.get("booking_id")
+    if isinstance(booking_id, str) and booking_id.isdigit():
+        booking_id = int(booking_id)
+
+    # Подготавливаем данные полей бронирования для отправки в Airtable
+    # Сначала добавляем только простые поля (текст и числа)
+    fields = {
+        "ID бронирования": booking_id,
+        "Дата заезда": booking_data.get("check_in_date"),
+        "Дата выезда": booking_data.get("check_out_date"),
+        "Стоимость": booking_data.get("total_price"),
+        "Временная метка создания записи": booking_data.get("current_time", current_time)
+    }
+
+    # Добавляем поля выбора только если они совпадают с предопределенными значениями
+    # (в реальном приложении можно реализовать проверку допустимых значений)
+    if booking_data.get("name"):
+        fields["Имя пользователя"] = booking_data.get("name")
+
+    if booking_data.get("apartment_name"):
+        fields["Название квартиры"] = booking_data.get("apartment_name")
+
+    if booking_data.get("status"):
+        fields["Статус"] = booking_data.get("status")
+
+    return fields
+
+
+def add_bookings_to_airtable(bookings):
+    """Добавляет пачку бронирований в Airtable; при ошибке выбрасывает AirtableError"""
+    logger.info(f"Отправка бронирований в Airtable: {len(bookings)}")
+    records = get_airtable_client().create_records([build_booking_fields(booking) for booking in bookings])
+    logger.info(f"Данные успешно записаны в Airtable, записей: {len(records)}")
+    return records
+
+
 def add_booking_to_airtable(booking_data):
     """Добавляет данные о бронировании в Airtable."""
     try:
-        # Полное логирование входных данных
         logger.info(f"Получены данные для сохранения в Airtable: {booking_data}")
-        
-        # Выводим значения переменных окружения для отладки
-        logger.info(f"AIRTABLE_API_KEY: {'*' * 5}{AIRTABLE_API_KEY[-5:] if AIRTABLE_API_KEY else 'не задан'}")
-        logger.info(f"AIRTABLE_BASE_ID: {AIRTABLE_BASE_ID or 'не задан'}")
-        logger.info(f"AIRTABLE_TABLE_NAME: {AIRTABLE_TABLE_NAME or 'не задан'}")
-        
-        # Формируем заголовки и URL для запроса
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
-        headers = {
-            "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # Получаем текущую дату и время для записи, если нет в booking_data
-        current_time = datetime.now().strftime("%d.%m.%Y %H:%M")
-        
-        # Преобразуем ID бронирования в число, если это строка
-        booking_id = booking_data.get("booking_id")
-        if isinstance(booking_id, str) and booking_id.isdigit():
-            booking_id = int(booking_id)
-        
-        # Подготавливаем данные полей бронирования для отправки в Airtable
-        # Сначала добавляем только простые поля (текст и числа)
-        fields = {
-            "ID бронирования": booking_id,
-            "Дата заезда": booking_data.get("check_in_date"),
-            "Дата выезда": booking_data.get("check_out_date"),
-            "Стоимость": booking_data.get("total_price"),
-            "Временная метка создания записи": booking_data.get("current_time", current_time)
-        }
-        
-        # Добавляем поля выбора только если они совпадают с предопределенными значениями
-        # (в реальном приложении можно реализовать проверку допустимых значений)
-        if booking_data.get("name"):
-            fields["Имя пользователя"] = booking_data.get("name")
-            
-        if booking_data.get("apartment_name"):
-            fields["Название квартиры"] = booking_data.get("apartment_name")
-            
-        if booking_data.get("status"):
-            fields["Статус"] = booking_data.get("status")
-        
-        payload = {"fields": fields}
-        logger.info(f"URL для запроса: {url}")
-        logger.info(f"Отправка данных бронирования в Airtable: {fields}")
-        
-        # Выполняем POST-запрос к Airtable API
-        response = requests.post(url, json=payload, headers=headers)
-        
-        # Логируем ответ от Airtable API
-        logger.info(f"Статус ответа: {response.status_code}")
-        logger.info(f"Ответ от Airtable: {response.text}")
-        
-        response.raise_for_status()  # выбросит исключение при ошибке HTTP
-        
-        logger.info("Данные успешно записаны в Airtable")
+        add_bookings_to_airtable([booking_data])
         return True
     except Exception as e:
         logger.error(f"Ошибка при добавлении данных в Airtable: {e}")
         # Выводим полную информацию об исключении для отладки
         import traceback
         logger.error(traceback.format_exc())
-        return False 
\ No newline at end of file
+        return False
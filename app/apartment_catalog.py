@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Булевы поля квартиры, которые в SQLite хранятся как 0/1
+APARTMENT_FLAGS = ('is_available', 'has_wifi', 'has_kitchen', 'has_parking', 'has_smart_lock')
+
+
+def apartment_to_dict(row):
+    """Преобразует строку таблицы apartments в JSON-совместимый словарь"""
+    apartment = dict(row)
+    for flag in APARTMENT_FLAGS:
+        if flag in apartment and apartment[flag] is not None:
+            apartment[flag] = bool(apartment[flag])
+    return apartment
+
+
+class CatalogResponse:
+    """Готовое тело ответа каталога и его ETag"""
+
+    __slots__ = ('version', 'body', 'etag')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+class ApartmentCatalogCache:
+    """Кэш сериализованных ответов /api/apartments по версии каталога.
+
+    Версия хранится в таблице apartment_catalog_version и увеличивается
+    триггерами на любое изменение apartments (Apartment.create/update/delete
+    и запись из других воркеров), поэтому устаревшие ответы не отдаются.
+    Пока версия не изменилась, ответ не читается из БД и не сериализуется заново.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._responses = OrderedDict()  # (cursor, limit) -> CatalogResponse
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current_version(conn):
+        row = conn.execute('SELECT version FROM apartment_catalog_version WHERE id = 1').fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _load(conn, cursor, limit):
+        query = 'SELECT * FROM apartments WHERE is_available = 1'
+        params = []
+        if cursor is not None:
+            query += ' AND id > ?'
+            params.append(cursor)
+        query += ' ORDER BY id'
+        if limit is not None:
+            # Лишняя строка показывает, есть ли следующая страница
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+        return [apartment_to_dict(row) for row in conn.execute(query, params)]
+
+    def get(self, conn, serialize, cursor=None, limit=None):
+        """Ответ каталога: весь список (limit=None) или страница после cursor"""
+        key = (cursor, limit)
+        version = self.current_version(conn)
+        with self._lock:
+            cached = self._responses.get(key)
+            if cached is not None and cached.version == version:
+                self._responses.move_to_end(key)
+                return cached
+
+        # Версию и строки читаем в одной транзакции, чтобы они соответствовали друг другу
+        conn.execute('BEGIN')
+        try:
+            version = self.current_version(conn)
+            apartments = self._load(conn, cursor, limit)
+        finally:
+            conn.rollback()
+
+        if limit is None:
+            data = apartments
+        else:
+            page = apartments[:limit]
+            data = {
+                'apartments': page,
+                'next_cursor': page[-1]['id'] if len(apartments) > limit else None,
+                'limit': limit
+            }
+
+        response = CatalogResponse(version, serialize(data))
+        with self._lock:
+            self._responses[key] = response
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.maxsize:
+                self._responses.popitem(last=False)
+        return response
+
+    def invalidate(self):
+        with self._lock:
+            self._responses.clear()
+
+
+# Кэш каталога процесса
+apartment_catalog = ApartmentCatalogCache()
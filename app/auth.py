@@ -1,19 +1,34 @@
 from flask import jsonify, request, current_app
 from app import app
-from app.database import User, Owner
+from app.database import User, Owner, Principal
 from datetime import datetime, timedelta
 import os
-import jwt
 import functools
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from io import BytesIO
+import hmac
+from app.document_uploads import spool_upload, enqueue_document_upload, DOCUMENT_PENDING
+from app.bot_events import publish_verification_change
+from app.auth_tokens import token_cache
+from app.telegram_webapp import InitDataError, validate_init_data
 
-# Декоратор для защиты маршрутов
+# Общий секрет бота: бот регистрирует пользователя по Telegram ID из своего апдейта
+BOT_API_SECRET = os.getenv('BOT_API_SECRET', '')
+BOT_API_SECRET_HEADER = 'X-Bot-Api-Secret'
+
+def trusted_telegram_id(data):
+    """Telegram ID из подписанной initData или от бота с общим секретом; None - вызывающему нельзя доверять"""
+    if data.get('init_data'):
+        return validate_init_data(data['init_data'])['user']['id']
+    secret = request.headers.get(BOT_API_SECRET_HEADER, '')
+    if BOT_API_SECRET and hmac.compare_digest(secret.encode('utf-8'), BOT_API_SECRET.encode('utf-8')):
+        return int(data['telegram_id']) if data.get('telegram_id') else None
+    return None
+
+# Декоратор для защиты маршрутов (jwt импортируется при первом запросе, не при старте воркера)
 def token_required(f):
     @functools.wraps(f)
     def decorated(*args, **kwargs):
+        import jwt
+        
         token = None
         
         # Получаем токен из заголовка
@@ -29,23 +44,13 @@ def token_required(f):
             }), 401
             
         try:
-            # Декодируем токен
-            data = jwt.decode(
-                token, 
-                current_app.config['SECRET_KEY'],
-                algorithms=["HS256"]
-            )
-            
-            # Получаем пользователя по Telegram ID
-            current_user = User.query.filter_by(telegram_id=data['telegram_id']).first()
+            # Проверенные токены кэшируются; пользователь и владелец ищутся одним запросом
+            current_user = token_cache.authenticate(token, current_app.config['SECRET_KEY'])
             if not current_user:
-                # Проверяем, может это владелец
-                current_user = Owner.query.filter_by(telegram_id=data['telegram_id']).first()
-                if not current_user:
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'Invalid token'
-                    }), 401
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Invalid token'
+                }), 401
                     
         except jwt.ExpiredSignatureError:
             return jsonify({
@@ -63,102 +68,50 @@ def token_required(f):
         
     return decorated
 
-def upload_to_drive(file_data, filename):
-    """Загрузка файла в Google Drive"""
-    try:
-        credentials_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), os.getenv('GOOGLE_CREDENTIALS_FILE') + '.json')
-        
-        if not os.path.exists(credentials_file):
-            app.logger.error(f"Файл учетных данных не найден: {credentials_file}")
-            raise FileNotFoundError(f"Credentials file not found: {credentials_file}")
-            
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_file,
-            scopes=['https://www.googleapis.com/auth/drive.file']
-        )
-        
-        service = build('drive', 'v3', credentials=credentials)
-        
-        # Создаем файл в памяти
-        fh = BytesIO(file_data)
-        
-        # Метаданные файла
-        file_metadata = {'name': filename}
-        
-        # Загружаем файл
-        media = MediaIoBaseUpload(fh, mimetype='image/jpeg', resumable=True)
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        
-        # Устанавливаем публичный доступ
-        service.permissions().create(
-            fileId=file.get('id'),
-            body={'role': 'reader', 'type': 'anyone'}
-        ).execute()
-        
-        return f"https://drive.google.com/uc?id={file.get('id')}"
-        
-    except Exception as e:
-        app.logger.error(f"Ошибка при загрузке в Google Drive: {str(e)}")
-        raise
-
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     """Аутентификация пользователя и выдача JWT токена"""
+    import jwt
+    
     try:
         data = request.json
         
-        if not data or 'telegram_id' not in data:
+        if not data or not data.get('init_data'):
             return jsonify({
                 'status': 'error',
-                'message': 'Missing telegram_id'
+                'message': 'init_data is required'
             }), 400
-            
-        telegram_id = data['telegram_id']
         
-        # Проверяем, существует ли пользователь
-        user = User.query.filter_by(telegram_id=telegram_id).first()
+        # Telegram ID только из подписанной initData Mini App; переданному напрямую не доверяем
+        try:
+            telegram_id = validate_init_data(data['init_data'])['user']['id']
+        except InitDataError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 401
         
-        # Если пользователя нет - проверяем, может это владелец
-        if not user:
-            owner = Owner.query.filter_by(telegram_id=telegram_id).first()
-            if not owner:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'User not found. Please register first.'
-                }), 404
-                
-            # Выдаем токен для владельца
-            token = jwt.encode({
-                'telegram_id': owner.telegram_id,
-                'is_owner': True,
-                'exp': datetime.utcnow() + timedelta(days=7)
-            }, current_app.config['SECRET_KEY'], algorithm="HS256")
-            
+        # Пользователь или владелец - одна выборка из таблицы учетных записей
+        principal = Principal.get_by_telegram_id(telegram_id)
+        if not principal:
             return jsonify({
-                'status': 'success',
-                'token': token,
-                'user_type': 'owner',
-                'user_id': owner.id,
-                'is_verified': owner.is_verified
-            })
+                'status': 'error',
+                'message': 'User not found. Please register first.'
+            }), 404
         
-        # Выдаем токен для обычного пользователя
+        is_owner = principal['role'] == 'owner'
         token = jwt.encode({
-            'telegram_id': user.telegram_id,
-            'is_owner': False,
+            'telegram_id': principal['telegram_id'],
+            'is_owner': is_owner,
             'exp': datetime.utcnow() + timedelta(days=7)
         }, current_app.config['SECRET_KEY'], algorithm="HS256")
         
         return jsonify({
             'status': 'success',
             'token': token,
-            'user_type': 'user',
-            'user_id': user.id,
-            'is_verified': user.is_verified
+            'user_type': principal['role'],
+            'user_id': principal['id'],
+            'is_verified': principal['is_verified']
         })
         
     except Exception as e:
@@ -171,47 +124,62 @@ def login():
 @app.route('/api/auth/register', methods=['POST'])
 def register_user():
     """Регистрация нового пользователя"""
+    import jwt
+    
     try:
+        data = request.form
+        
+        # Telegram ID из подписанной initData или от бота; переданному напрямую не доверяем
+        try:
+            telegram_id = trusted_telegram_id(data)
+        except InitDataError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 401
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid telegram_id'}), 400
+        if telegram_id is None:
+            return jsonify({'status': 'error', 'message': 'init_data or bot secret is required'}), 401
+        
         if 'document_photo' not in request.files:
             return jsonify({'status': 'error', 'message': 'No document photo provided'}), 400
-            
-        data = request.form
         photo = request.files['document_photo']
         
-        if 'telegram_id' not in data:
-            return jsonify({'status': 'error', 'message': 'Missing telegram_id'}), 400
-        
-        # Проверяем существование пользователя
-        existing_user = User.query.filter_by(telegram_id=data['telegram_id']).first()
-        if existing_user:
-            return jsonify({'status': 'error', 'message': 'User already exists'}), 400
+        # Telegram ID уже занят пользователем или владельцем: новая запись перекрыла бы его при входе
+        if Principal.get_by_telegram_id(telegram_id):
+            return jsonify({'status': 'error', 'message': 'User already exists'}), 409
         
-        # Загружаем фото в Google Drive
-        photo_url = upload_to_drive(photo.read(), f"document_{data['telegram_id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg")
+        # Сохраняем фото в спул потоково; в Google Drive его загрузит фоновый обработчик
+        spool_path = spool_upload(photo, f"document_{telegram_id}")
         
         # Создаем нового пользователя
-        user = User(
-            telegram_id=int(data['telegram_id']),
-            username=data.get('username'),
-            full_name=data.get('full_name')
+        user_id = User.create(
+            username=data.get('username') or str(telegram_id),
+            telegram_id=telegram_id,
+            full_name=data.get('full_name'),
+            document_status=DOCUMENT_PENDING
         )
         
-        db.session.add(user)
-        db.session.commit()
+        enqueue_document_upload(
+            user_id,
+            spool_path,
+            f"document_{telegram_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg",
+            photo.mimetype or 'image/jpeg'
+        )
         
         # Генерируем токен
         token = jwt.encode({
-            'telegram_id': user.telegram_id,
+            'telegram_id': telegram_id,
             'is_owner': False,
             'exp': datetime.utcnow() + timedelta(days=7)
         }, current_app.config['SECRET_KEY'], algorithm="HS256")
         
+        # 202: регистрация принята, загрузка документа продолжается в фоне
         return jsonify({
             'status': 'success',
-            'user_id': user.id,
+            'user_id': user_id,
             'token': token,
+            'document_status': DOCUMENT_PENDING,
             'message': 'Registration successful, waiting for verification'
-        })
+        }), 202
         
     except Exception as e:
         app.logger.error(f"Ошибка при регистрации: {str(e)}")
@@ -226,24 +194,33 @@ def verify_user(current_user, user_id):
     """Ручная верификация пользователя администратором"""
     try:
         # Проверяем, является ли текущий пользователь владельцем с правами админа
-        if not hasattr(current_user, 'is_admin') or not current_user.is_admin:
+        if not current_user.is_admin:
             return jsonify({
                 'status': 'error', 
                 'message': 'Insufficient permissions'
             }), 403
         
-        user = User.query.get_or_404(user_id)
-        
         data = request.json
         if not data or 'verified' not in data:
             return jsonify({
                 'status': 'error', 
                 'message': 'Missing verification status'
             }), 400
+        
+        user = User.get_by_id(user_id)
+        if not user:
+            return jsonify({
+                'status': 'error', 
+                'message': 'User not found'
+            }), 404
             
         if data.get('verified'):
-            user.is_verified = True
-            db.session.commit()
+            User.update(user_id, is_verified=1)
+            if user['telegram_id'] is not None:
+                # Закэшированные токены пользователя больше не отражают его статус
+                token_cache.revoke_principal(user['telegram_id'])
+                # Бот сбрасывает кэш статуса сразу, не дожидаясь истечения TTL
+                publish_verification_change(user['telegram_id'], True)
             return jsonify({
                 'status': 'success', 
                 'message': 'User verified successfully'
@@ -265,31 +242,19 @@ def verify_user(current_user, user_id):
 def check_auth_status(telegram_id):
     """Проверка статуса верификации пользователя"""
     try:
-        user = User.query.filter_by(telegram_id=telegram_id).first()
-        
-        if not user:
-            # Проверяем, может это владелец
-            owner = Owner.query.filter_by(telegram_id=telegram_id).first()
-            if not owner:
-                return jsonify({
-                    'status': 'error', 
-                    'message': 'User not found'
-                }), 404
-                
+        principal = Principal.get_by_telegram_id(telegram_id)
+        if not principal:
             return jsonify({
-                'status': 'success',
-                'user_type': 'owner',
-                'user_id': owner.id,
-                'is_verified': owner.is_verified,
-                'registration_date': owner.registration_date.isoformat() if owner.registration_date else None
-            })
+                'status': 'error', 
+                'message': 'User not found'
+            }), 404
             
         return jsonify({
             'status': 'success',
-            'user_type': 'user',
-            'user_id': user.id,
-            'is_verified': user.is_verified,
-            'registration_date': user.registration_date.isoformat() if user.registration_date else None
+            'user_type': principal['role'],
+            'user_id': principal['id'],
+            'is_verified': principal['is_verified'],
+            'registration_date': principal['registered_at']
         })
         
     except Exception as e:
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.database import Principal
+
+# Сколько проверенных токенов держать в памяти процесса
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))
+# Сколько секунд доверять закэшированным данным пользователя (роль, верификация)
+JWT_CACHE_TTL = float(os.getenv('JWT_CACHE_TTL', 60))
+JWT_ALGORITHMS = ['HS256']
+# Владельцы с правами администратора (верификация пользователей), Telegram ID через запятую
+ADMIN_TELEGRAM_IDS = frozenset(
+    int(telegram_id) for telegram_id in os.getenv('ADMIN_TELEGRAM_IDS', '').split(',') if telegram_id.strip()
+)
+
+
+class AuthenticatedPrincipal:
+    """Пользователь или владелец, которому выдан токен"""
+
+    __slots__ = ('role', 'id', 'telegram_id', 'username', 'full_name', 'is_verified')
+
+    def __init__(self, row):
+        self.role = row['role']
+        self.id = row['id']
+        self.telegram_id = row['telegram_id']
+        self.username = row['username']
+        self.full_name = row['full_name']
+        self.is_verified = bool(row['is_verified'])
+
+    @property
+    def is_owner(self):
+        return self.role == 'owner'
+
+    @property
+    def is_admin(self):
+        """Администратор - владелец, Telegram ID которого указан в ADMIN_TELEGRAM_IDS"""
+        return self.is_owner and self.telegram_id in ADMIN_TELEGRAM_IDS
+
+
+class TokenCache:
+    """LRU-кэш проверенных JWT: токен -> пользователь.
+
+    Повторный запрос с тем же токеном не проверяет подпись и не читает БД.
+    Запись живет до exp токена, но не дольше JWT_CACHE_TTL, чтобы изменения
+    роли и верификации из других воркеров подхватывались. Токены хранятся
+    как хеши.
+    """
+
+    def __init__(self, maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # хеш токена -> (истекает, пользователь)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token, secret_key):
+        # Ключ зависит и от секрета: смена SECRET_KEY не оставляет действующими старые записи
+        return hashlib.sha256(f'{secret_key}\0{token}'.encode('utf-8')).digest()
+
+    def authenticate(self, token, secret_key):
+        """Пользователь токена; None, если пользователя нет.
+
+        Исключения jwt (ExpiredSignatureError, InvalidTokenError) пробрасываются.
+        """
+        import jwt
+
+        key = self._key(token, secret_key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        data = jwt.decode(token, secret_key, algorithms=JWT_ALGORITHMS)
+        if data.get('telegram_id') is None:
+            raise jwt.InvalidTokenError('Token has no telegram_id')
+        row = Principal.get_by_telegram_id(data['telegram_id'])
+        if row is None:
+            return None
+
+        principal = AuthenticatedPrincipal(row)
+        expires_at = min(now + self.ttl, data.get('exp', now + self.ttl))
+        with self._lock:
+            self._entries[key] = (expires_at, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return principal
+
+    def revoke(self, token, secret_key):
+        """Убрать токен из кэша"""
+        with self._lock:
+            self._entries.pop(self._key(token, secret_key), None)
+
+    def revoke_principal(self, telegram_id):
+        """Убрать все токены пользователя (смена роли или верификации)"""
+        with self._lock:
+            for key in [key for key, (_, principal) in self._entries.items() if principal.telegram_id == telegram_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Кэш токенов процесса
+token_cache = TokenCache()
@@ -0,0 +1,170 @@
+import threading
+from datetime import date, timedelta
+
+from app.booking_index import BookingIntervalIndex, to_night
+
+# Бит 0 битовой карты соответствует ночи с этой даты
+CALENDAR_EPOCH = date(2020, 1, 1).toordinal()
+
+
+def _range_mask(start, end):
+    """Маска битов для ночей [start, end) относительно эпохи календаря"""
+    start = max(start, CALENDAR_EPOCH) - CALENDAR_EPOCH
+    end = max(end, CALENDAR_EPOCH) - CALENDAR_EPOCH
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+class ApartmentCalendar:
+    """Битовая карта занятости квартиры: один бит на ночь (int как битсет)"""
+
+    __slots__ = ('version', 'bookings', 'bits')
+
+    def __init__(self, version, bookings=None):
+        self.version = version
+        self.bookings = dict(bookings or {})  # booking_id -> (start, end)
+        self.bits = 0
+        for start, end in self.bookings.values():
+            self.bits |= _range_mask(start, end)
+
+    def add(self, booking_id, start, end):
+        self.remove(booking_id)
+        self.bookings[booking_id] = (start, end)
+        self.bits |= _range_mask(start, end)
+
+    def remove(self, booking_id):
+        interval = self.bookings.pop(booking_id, None)
+        if interval is None:
+            return
+        start, end = interval
+        self.bits &= ~_range_mask(start, end)
+        # Ночи могут быть заняты другими (пересекающимися) бронированиями
+        for other_start, other_end in self.bookings.values():
+            if other_start < end and other_end > start:
+                self.bits |= _range_mask(max(other_start, start), min(other_end, end))
+
+    def slice(self, start, end):
+        """Занятость ночей [start, end) в виде строки из '0' и '1'"""
+        length = end - start
+        if length <= 0:
+            return ''
+        offset = start - CALENDAR_EPOCH
+        if offset >= 0:
+            window = (self.bits >> offset) & ((1 << length) - 1)
+        else:
+            # Ночи до эпохи календаря всегда свободны
+            window = (self.bits << -offset) & ((1 << length) - 1)
+        return format(window, f'0{length}b')[::-1]
+
+
+class AvailabilityCalendar:
+    """Календари занятости всех квартир процесса.
+
+    Поддерживаются инкрементально при создании и отмене бронирований и
+    перечитываются из таблицы bookings, если версия квартиры в booking_versions
+    изменилась (запись из другого воркера).
+    """
+
+    def __init__(self):
+        self._calendars = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _active_bookings(conn, apartment_id=None):
+        query = "SELECT id, apartment_id, check_in_date, check_out_date FROM bookings WHERE status != 'cancelled'"
+        params = []
+        if apartment_id is not None:
+            query += ' AND apartment_id = ?'
+            params.append(apartment_id)
+
+        by_apartment = {}
+        for row in conn.execute(query, params):
+            by_apartment.setdefault(row[1], {})[row[0]] = (to_night(row[2]), to_night(row[3]))
+        return by_apartment
+
+    def rebuild(self, conn):
+        """Полностью перестроить календари из таблицы (при старте)"""
+        versions = dict(conn.execute('SELECT apartment_id, version FROM booking_versions').fetchall())
+        by_apartment = self._active_bookings(conn)
+        calendars = {
+            apartment_id: ApartmentCalendar(versions.get(apartment_id, 0), by_apartment.get(apartment_id))
+            for apartment_id in set(versions) | set(by_apartment)
+        }
+        with self._lock:
+            self._calendars = calendars
+        return len(calendars)
+
+    def get(self, conn, apartment_id):
+        version = BookingIntervalIndex.current_version(conn, apartment_id)
+        with self._lock:
+            calendar = self._calendars.get(apartment_id)
+            if calendar is not None and calendar.version == version:
+                return calendar
+
+        bookings = self._active_bookings(conn, apartment_id).get(apartment_id)
+        calendar = ApartmentCalendar(version, bookings)
+        with self._lock:
+            self._calendars[apartment_id] = calendar
+        return calendar
+
+    def occupancy(self, conn, apartment_id, date_from, date_to):
+        """Список (дата, занята) для ночей [date_from, date_to)"""
+        calendar = self.get(conn, apartment_id)
+        start, end = to_night(date_from), to_night(date_to)
+        with self._lock:
+            bits = calendar.slice(start, end)
+        first_day = date.fromordinal(start)
+        return [(first_day + timedelta(days=i), bit == '1') for i, bit in enumerate(bits)]
+
+    def sync_booking(self, conn, apartment_id, booking_id):
+        """Инкрементально обновить календарь в транзакции записи бронирования"""
+        version = BookingIntervalIndex.current_version(conn, apartment_id)
+        row = conn.execute(
+            'SELECT check_in_date, check_out_date, status FROM bookings WHERE id = ?', (booking_id,)
+        ).fetchone()
+
+        with self._lock:
+            calendar = self._calendars.get(apartment_id)
+            if calendar is None:
+                if version == 1:
+                    calendar = self._calendars[apartment_id] = ApartmentCalendar(0)
+                else:
+                    return
+            if calendar.version != version - 1:
+                del self._calendars[apartment_id]
+                return
+
+            if row is None or row['status'] == 'cancelled':
+                calendar.remove(booking_id)
+            else:
+                calendar.add(booking_id, to_night(row['check_in_date']), to_night(row['check_out_date']))
+            calendar.version = version
+
+    def verify(self, conn):
+        """ID квартир, у которых битовая карта расходится с таблицей bookings"""
+        mismatched = []
+        with self._lock:
+            apartment_ids = list(self._calendars)
+        for apartment_id in apartment_ids:
+            version = BookingIntervalIndex.current_version(conn, apartment_id)
+            with self._lock:
+                calendar = self._calendars.get(apartment_id)
+            if calendar is None or calendar.version != version:
+                # Устаревший календарь будет перечитан при следующем обращении
+                continue
+            expected = ApartmentCalendar(version, self._active_bookings(conn, apartment_id).get(apartment_id))
+            if expected.bits != calendar.bits:
+                mismatched.append(apartment_id)
+        return mismatched
+
+    def invalidate(self, apartment_id=None):
+        with self._lock:
+            if apartment_id is None:
+                self._calendars.clear()
+            else:
+                self._calendars.pop(apartment_id, None)
+
+
+# Календари процесса
+availability_calendar = AvailabilityCalendar()
@@ -0,0 +1,161 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime
+
+
+def to_night(value):
+    """Порядковый номер дня (ночи) для даты в формате ISO, date или datetime"""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class ApartmentIntervals:
+    """Отсортированные интервалы активных бронирований одной квартиры.
+
+    Интервалы хранятся как полуоткрытые [заезд, выезд) в ночах и отсортированы
+    по дате заезда. Массив max_ends содержит префиксный максимум дат выезда,
+    поэтому проверка пересечения - один бинарный поиск: O(log n).
+    """
+
+    __slots__ = ('version', 'intervals', 'max_ends')
+
+    def __init__(self, version, intervals=()):
+        self.version = version
+        self.intervals = sorted(intervals)  # (start, end, booking_id)
+        self.max_ends = []
+        self._rebuild_max_ends(0)
+
+    def _rebuild_max_ends(self, position):
+        del self.max_ends[position:]
+        current = self.max_ends[-1] if self.max_ends else None
+        for start, end, _ in self.intervals[position:]:
+            current = end if current is None or end > current else current
+            self.max_ends.append(current)
+
+    def add(self, booking_id, start, end):
+        item = (start, end, booking_id)
+        position = bisect_left(self.intervals, item)
+        insort(self.intervals, item)
+        self._rebuild_max_ends(position)
+
+    def remove(self, booking_id):
+        for position, (_, _, current_id) in enumerate(self.intervals):
+            if current_id == booking_id:
+                del self.intervals[position]
+                self._rebuild_max_ends(position)
+                return True
+        return False
+
+    def _last_candidate(self, end):
+        # Индекс последнего интервала, который начинается раньше выезда
+        return bisect_left(self.intervals, (end,)) - 1
+
+    def overlaps(self, start, end):
+        position = self._last_candidate(end)
+        return position >= 0 and self.max_ends[position] > start
+
+    def find_overlaps(self, start, end):
+        """ID бронирований, пересекающихся с [start, end)"""
+        result = []
+        position = self._last_candidate(end)
+        while position >= 0 and self.max_ends[position] > start:
+            interval_start, interval_end, booking_id = self.intervals[position]
+            if interval_end > start:
+                result.append(booking_id)
+            position -= 1
+        result.reverse()
+        return result
+
+
+class BookingIntervalIndex:
+    """Процессный индекс интервалов бронирований по квартирам.
+
+    Актуальность проверяется по таблице booking_versions, которую обновляют
+    триггеры на bookings, поэтому изменения из других воркеров gunicorn
+    приводят к перечитыванию данных только для затронутой квартиры.
+    """
+
+    def __init__(self):
+        self._apartments = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current_version(conn, apartment_id):
+        row = conn.execute(
+            'SELECT version FROM booking_versions WHERE apartment_id = ?', (apartment_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _load(conn, apartment_id, version):
+        rows = conn.execute(
+            "SELECT id, check_in_date, check_out_date FROM bookings WHERE apartment_id = ? AND status != 'cancelled'",
+            (apartment_id,)
+        ).fetchall()
+        return ApartmentIntervals(
+            version,
+            ((to_night(row[1]), to_night(row[2]), row[0]) for row in rows)
+        )
+
+    def get(self, conn, apartment_id):
+        """Актуальные интервалы квартиры (перечитываются, если версия изменилась)"""
+        version = self.current_version(conn, apartment_id)
+        with self._lock:
+            intervals = self._apartments.get(apartment_id)
+            if intervals is not None and intervals.version == version:
+                return intervals
+
+        intervals = self._load(conn, apartment_id, version)
+        with self._lock:
+            self._apartments[apartment_id] = intervals
+        return intervals
+
+    def has_conflict(self, conn, apartment_id, check_in, check_out):
+        intervals = self.get(conn, apartment_id)
+        with self._lock:
+            return intervals.overlaps(to_night(check_in), to_night(check_out))
+
+    def find_conflicts(self, conn, apartment_id, check_in, check_out):
+        intervals = self.get(conn, apartment_id)
+        with self._lock:
+            return intervals.find_overlaps(to_night(check_in), to_night(check_out))
+
+    def sync_booking(self, conn, apartment_id, booking_id):
+        """Синхронизировать индекс после записи бронирования.
+
+        Вызывается в той же транзакции, что и запись (до commit): версия,
+        увеличенная триггером, принадлежит именно этой записи, поэтому индекс
+        обновляется инкрементально, если до записи он был актуален.
+        """
+        version = self.current_version(conn, apartment_id)
+        row = conn.execute(
+            'SELECT check_in_date, check_out_date, status FROM bookings WHERE id = ?', (booking_id,)
+        ).fetchone()
+
+        with self._lock:
+            intervals = self._apartments.get(apartment_id)
+            if intervals is None:
+                return
+            if intervals.version != version - 1:
+                # Пропустили чужие изменения - перечитаем при следующем обращении
+                del self._apartments[apartment_id]
+                return
+
+            intervals.remove(booking_id)
+            if row is not None and row['status'] != 'cancelled':
+                intervals.add(booking_id, to_night(row['check_in_date']), to_night(row['check_out_date']))
+            intervals.version = version
+
+    def invalidate(self, apartment_id=None):
+        with self._lock:
+            if apartment_id is None:
+                self._apartments.clear()
+            else:
+                self._apartments.pop(apartment_id, None)
+
+
+# Индекс процесса
+booking_index = BookingIntervalIndex()
@@ -0,0 +1,47 @@
+import logging
+import os
+import time
+
+from app import outbox
+
+logger = logging.getLogger(__name__)
+
+# Адрес приемника событий бота (bot/events_server.py); без него события не отправляются
+BOT_EVENTS_URL = os.getenv('BOT_EVENTS_URL')
+BOT_EVENTS_SECRET = os.getenv('BOT_EVENTS_SECRET', '')
+BOT_EVENTS_TIMEOUT = float(os.getenv('BOT_EVENTS_TIMEOUT', 5))
+
+OUTBOX_TARGET = 'bot_events'
+
+
+def publish_verification_change(telegram_id, is_verified):
+    """Сообщить боту об изменении статуса верификации (через outbox)"""
+    if not BOT_EVENTS_URL:
+        return False
+    if not BOT_EVENTS_SECRET:
+        # Бот не принимает события без секрета
+        logger.warning("BOT_EVENTS_SECRET не задан, событие для бота не отправлено")
+        return False
+    payload = {
+        'event': 'verification_changed',
+        'telegram_id': telegram_id,
+        'is_verified': bool(is_verified)
+    }
+    # Каждое изменение - отдельное событие, поэтому в ключе время публикации
+    return outbox.enqueue_now(OUTBOX_TARGET, payload, f"{OUTBOX_TARGET}:verification:{telegram_id}:{time.time_ns()}")
+
+
+def deliver_bot_event(payload, idempotency_key):
+    """Обработчик outbox: отправить событие в бот"""
+    import requests
+
+    if not BOT_EVENTS_URL:
+        logger.warning(f"BOT_EVENTS_URL не настроен, событие {idempotency_key} пропущено")
+        return
+    response = requests.post(
+        BOT_EVENTS_URL,
+        json=payload,
+        headers={'X-Bot-Events-Secret': BOT_EVENTS_SECRET},
+        timeout=BOT_EVENTS_TIMEOUT
+    )
+    response.raise_for_status()
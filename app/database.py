@@ -1,49 +1,80 @@
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from app.db_tuning import retry_on_locked
+from app.booking_index import booking_index
+from app.availability_calendar import availability_calendar
+from app.principals import principal_directory, KIND_USER, KIND_OWNER
+from app import outbox
 
-def get_db_connection():
-    """Получить соединение с базой данных SQLite"""
-    from app import get_db_connection as app_get_db_connection
-    return app_get_db_connection()
+def get_connection():
+    """Получить соединение с базой данных SQLite из пула (контекстный менеджер)"""
+    from app import get_pooled_connection
+    return get_pooled_connection()
+
+def commit_principal(conn, kind, principal_id):
+    """Commit записи в users/owners с обновлением таблицы учетных записей процесса"""
+    principal_directory.sync(conn, kind, principal_id)
+    try:
+        conn.commit()
+    except Exception:
+        principal_directory.invalidate()
+        raise
 
 class User:
     """Класс для работы с пользователями"""
     
     @staticmethod
     def get_by_id(user_id):
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
         return user
     
     @staticmethod
     def get_by_email(email):
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
         return user
     
     @staticmethod
     def get_by_telegram_id(telegram_id):
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            user = conn.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
         return user
     
     @staticmethod
-    def create(username, email=None, password_hash=None, telegram_id=None):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO users (username, email, password_hash, telegram_id) VALUES (?, ?, ?, ?)',
-            (username, email, password_hash, telegram_id)
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
-        conn.close()
+    @retry_on_locked
+    def create(username, email=None, password_hash=None, telegram_id=None, full_name=None, document_status=None):
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO users (username, email, password_hash, telegram_id, full_name, document_status) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (username, email, password_hash, telegram_id, full_name, document_status)
+            )
+            user_id = cursor.lastrowid
+            commit_principal(conn, KIND_USER, user_id)
         return user_id
     
     @staticmethod
+    def find_or_insert(conn, username, telegram_id=None):
+        """ID пользователя по проверенному Telegram ID, иначе новый гость - в транзакции вызывающего кода (без commit)
+
+        Без telegram_id всегда создается анонимный гость: данные из тела запроса
+        (email, user_id) не используются для привязки к существующим аккаунтам.
+        """
+        if telegram_id:
+            row = conn.execute('SELECT id FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
+            if row:
+                return row[0]
+        cursor = conn.execute(
+            'INSERT INTO users (username, telegram_id) VALUES (?, ?)',
+            (username, telegram_id or None)
+        )
+        principal_directory.sync(conn, KIND_USER, cursor.lastrowid)
+        return cursor.lastrowid
+    
+    @staticmethod
+    @retry_on_locked
     def update(user_id, **kwargs):
         if not kwargs:
             return False
@@ -52,19 +83,17 @@ class User:
         params = list(kwargs.values())
         params.append(user_id)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(f'UPDATE users SET {set_clause} WHERE id = ?', params)
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE users SET {set_clause} WHERE id = ?', params)
+            commit_principal(conn, KIND_USER, user_id)
+            success = cursor.rowcount > 0
         return success
     
     @staticmethod
     def get_all():
-        conn = get_db_connection()
-        users = conn.execute('SELECT * FROM users').fetchall()
-        conn.close()
+        with get_connection() as conn:
+            users = conn.execute('SELECT * FROM users').fetchall()
         return users
 
 class Owner:
@@ -72,32 +101,31 @@ class Owner:
     
     @staticmethod
     def get_by_id(owner_id):
-        conn = get_db_connection()
-        owner = conn.execute('SELECT * FROM owners WHERE id = ?', (owner_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            owner = conn.execute('SELECT * FROM owners WHERE id = ?', (owner_id,)).fetchone()
         return owner
     
     @staticmethod
     def get_by_telegram_id(telegram_id):
-        conn = get_db_connection()
-        owner = conn.execute('SELECT * FROM owners WHERE telegram_id = ?', (telegram_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            owner = conn.execute('SELECT * FROM owners WHERE telegram_id = ?', (telegram_id,)).fetchone()
         return owner
     
     @staticmethod
+    @retry_on_locked
     def create(telegram_id, username=None, full_name=None, phone=None, email=None, is_verified=False):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO owners (telegram_id, username, full_name, phone, email, is_verified) VALUES (?, ?, ?, ?, ?, ?)',
-            (telegram_id, username, full_name, phone, email, is_verified)
-        )
-        conn.commit()
-        owner_id = cursor.lastrowid
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO owners (telegram_id, username, full_name, phone, email, is_verified) VALUES (?, ?, ?, ?, ?, ?)',
+                (telegram_id, username, full_name, phone, email, is_verified)
+            )
+            owner_id = cursor.lastrowid
+            commit_principal(conn, KIND_OWNER, owner_id)
         return owner_id
     
     @staticmethod
+    @retry_on_locked
     def update(owner_id, **kwargs):
         if not kwargs:
             return False
@@ -106,45 +134,55 @@ class Owner:
         params = list(kwargs.values())
         params.append(owner_id)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(f'UPDATE owners SET {set_clause} WHERE id = ?', params)
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE owners SET {set_clause} WHERE id = ?', params)
+            commit_principal(conn, KIND_OWNER, owner_id)
+            success = cursor.rowcount > 0
         return success
     
     @staticmethod
     def get_all():
-        conn = get_db_connection()
-        owners = conn.execute('SELECT * FROM owners').fetchall()
-        conn.close()
+        with get_connection() as conn:
+            owners = conn.execute('SELECT * FROM owners').fetchall()
         return owners
 
+class Principal:
+    """Пользователь или владелец по telegram_id"""
+    
+    @staticmethod
+    def get_by_telegram_id(telegram_id):
+        """Словарь {role, id, telegram_id, ...} из таблицы учетных записей; пользователь имеет приоритет"""
+        with get_connection() as conn:
+            return principal_directory.get(conn, telegram_id)
+
 class Apartment:
     """Класс для работы с квартирами"""
     
     @staticmethod
     def get_by_id(apartment_id):
-        conn = get_db_connection()
-        apartment = conn.execute('SELECT * FROM apartments WHERE id = ?', (apartment_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            apartment = conn.execute('SELECT * FROM apartments WHERE id = ?', (apartment_id,)).fetchone()
         return apartment
     
     @staticmethod
-    def create(title, address, price_per_day, description=None, image_url=None, owner_id=None, smart_lock_id=None, is_available=True):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO apartments (title, address, description, price_per_day, image_url, owner_id, smart_lock_id, is_available) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-            (title, address, description, price_per_day, image_url, owner_id, smart_lock_id, is_available)
-        )
-        conn.commit()
-        apartment_id = cursor.lastrowid
-        conn.close()
+    @retry_on_locked
+    def create(title, address, price_per_day, description=None, image_url=None, owner_id=None, smart_lock_id=None, is_available=True,
+               has_wifi=False, has_kitchen=False, has_parking=False, has_smart_lock=False):
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO apartments (title, address, description, price_per_day, image_url, owner_id, smart_lock_id, is_available, '
+                'has_wifi, has_kitchen, has_parking, has_smart_lock) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (title, address, description, price_per_day, image_url, owner_id, smart_lock_id, is_available,
+                 has_wifi, has_kitchen, has_parking, has_smart_lock)
+            )
+            conn.commit()
+            apartment_id = cursor.lastrowid
         return apartment_id
     
     @staticmethod
+    @retry_on_locked
     def update(apartment_id, **kwargs):
         if not kwargs:
             return False
@@ -153,109 +191,242 @@ class Apartment:
         params = list(kwargs.values())
         params.append(apartment_id)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(f'UPDATE apartments SET {set_clause} WHERE id = ?', params)
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE apartments SET {set_clause} WHERE id = ?', params)
+            conn.commit()
+            success = cursor.rowcount > 0
         return success
     
     @staticmethod
     def get_all(available_only=True, owner_id=None):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = 'SELECT * FROM apartments'
+        with get_connection() as conn:
+            cursor = conn.cursor()
+
+            query = 'SELECT * FROM apartments'
+            params = []
+
+            conditions = []
+            if available_only:
+                conditions.append('is_available = ?')
+                params.append(True)
+
+            if owner_id:
+                conditions.append('owner_id = ?')
+                params.append(owner_id)
+
+            if conditions:
+                query += ' WHERE ' + ' AND '.join(conditions)
+
+            apartments = cursor.execute(query, params).fetchall()
+        return apartments
+    
+    @staticmethod
+    def search_available(check_in_date, check_out_date, min_price=None, max_price=None,
+                         has_wifi=None, has_parking=None, owner_id=None):
+        """Свободные квартиры на даты с фильтрами - один запрос вместо проверки каждой квартиры"""
+        query = 'SELECT a.* FROM apartments a WHERE a.is_available = 1'
         params = []
-        
-        conditions = []
-        if available_only:
-            conditions.append('is_available = ?')
-            params.append(True)
-        
-        if owner_id:
-            conditions.append('owner_id = ?')
+
+        if min_price is not None:
+            query += ' AND a.price_per_day >= ?'
+            params.append(min_price)
+
+        if max_price is not None:
+            query += ' AND a.price_per_day <= ?'
+            params.append(max_price)
+
+        if has_wifi is not None:
+            query += ' AND a.has_wifi = ?'
+            params.append(bool(has_wifi))
+
+        if has_parking is not None:
+            query += ' AND a.has_parking = ?'
+            params.append(bool(has_parking))
+
+        if owner_id is not None:
+            query += ' AND a.owner_id = ?'
             params.append(owner_id)
-        
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
-        
-        apartments = cursor.execute(query, params).fetchall()
-        conn.close()
+
+        # Даты сравниваются по дню (ночи) напрямую по колонкам, без substr, чтобы
+        # работал индекс idx_bookings_apartment_status_dates. Выезд в день заезда
+        # (в том числе со временем) не пересекается - граница выезда со следующего дня
+        day_after_check_in = (date.fromisoformat(check_in_date[:10]) + timedelta(days=1)).isoformat()
+        query += '''
+            AND NOT EXISTS (
+                SELECT 1 FROM bookings b
+                WHERE b.apartment_id = a.id
+                  AND b.status != 'cancelled'
+                  AND b.check_in_date < ?
+                  AND b.check_out_date >= ?
+            )
+            ORDER BY a.price_per_day, a.id
+        '''
+        params.extend([check_out_date[:10], day_after_check_in])
+
+        with get_connection() as conn:
+            apartments = conn.execute(query, params).fetchall()
         return apartments
     
     @staticmethod
+    @retry_on_locked
     def delete(apartment_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM apartments WHERE id = ?', (apartment_id,))
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM apartments WHERE id = ?', (apartment_id,))
+            conn.commit()
+            success = cursor.rowcount > 0
         return success
 
+class BookingConflictError(Exception):
+    """Даты бронирования пересекаются с активными бронированиями квартиры"""
+
+    def __init__(self, apartment_id, conflicting_ids):
+        super().__init__(f'Apartment {apartment_id} is already booked for selected dates')
+        self.apartment_id = apartment_id
+        self.conflicting_ids = conflicting_ids
+
 class Booking:
     """Класс для работы с бронированиями"""
     
     @staticmethod
     def get_by_id(booking_id):
-        conn = get_db_connection()
-        booking = conn.execute('SELECT * FROM bookings WHERE id = ?', (booking_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            booking = conn.execute('SELECT * FROM bookings WHERE id = ?', (booking_id,)).fetchone()
         return booking
     
     @staticmethod
-    def create(user_id, apartment_id, check_in_date, check_out_date, total_price, status='pending'):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO bookings (user_id, apartment_id, check_in_date, check_out_date, total_price, status) VALUES (?, ?, ?, ?, ?, ?)',
-            (user_id, apartment_id, check_in_date, check_out_date, total_price, status)
-        )
-        conn.commit()
-        booking_id = cursor.lastrowid
-        conn.close()
+    @retry_on_locked
+    def create(user_id, apartment_id, check_in_date, check_out_date, total_price, status='pending', outbox_events=None,
+               guest=None):
+        """Создать бронирование; outbox_events - список (назначение, данные) для фоновой синхронизации.
+
+        Проверка пересечений и вставка выполняются в одной транзакции
+        BEGIN IMMEDIATE: блокировка записи берется до проверки, поэтому
+        параллельные запросы (в том числе из других воркеров) не могут занять
+        одни и те же ночи. При пересечении - BookingConflictError.
+
+        guest - {username, telegram_id} вместо user_id: пользователь
+        находится или создается в той же транзакции после проверки
+        пересечений, поэтому отказ не оставляет лишних записей в users.
+        """
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if status != 'cancelled':
+                conflicts = booking_index.find_conflicts(conn, apartment_id, check_in_date, check_out_date)
+                if conflicts:
+                    raise BookingConflictError(apartment_id, conflicts)
+            try:
+                if guest is not None:
+                    user_id = User.find_or_insert(conn, **guest)
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO bookings (user_id, apartment_id, check_in_date, check_out_date, total_price, status) VALUES (?, ?, ?, ?, ?, ?)',
+                    (user_id, apartment_id, check_in_date, check_out_date, total_price, status)
+                )
+                booking_id = cursor.lastrowid
+                Booking._sync_indexes(conn, apartment_id, booking_id)
+                Booking._enqueue_events(conn, booking_id, status, outbox_events)
+                conn.commit()
+            except Exception:
+                Booking._invalidate(apartment_id)
+                raise
+        if outbox_events:
+            outbox.dispatcher.wake()
         return booking_id
     
     @staticmethod
-    def update_status(booking_id, status):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE bookings SET status = ? WHERE id = ?', (status, booking_id))
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+    @retry_on_locked
+    def update_status(booking_id, status, outbox_events=None):
+        """Сменить статус; outbox_events ставятся в очередь в той же транзакции, что и смена статуса"""
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE bookings SET status = ? WHERE id = ?', (status, booking_id))
+            success = cursor.rowcount > 0
+            if success:
+                apartment_id = conn.execute('SELECT apartment_id FROM bookings WHERE id = ?', (booking_id,)).fetchone()[0]
+                try:
+                    Booking._sync_indexes(conn, apartment_id, booking_id)
+                    Booking._enqueue_events(conn, booking_id, status, outbox_events)
+                    conn.commit()
+                except Exception:
+                    Booking._invalidate(apartment_id)
+                    raise
+            else:
+                conn.commit()
+        if success and outbox_events:
+            outbox.dispatcher.wake()
         return success
     
+    @staticmethod
+    def _sync_indexes(conn, apartment_id, booking_id):
+        """Обновить индекс интервалов и календарь занятости в транзакции записи"""
+        booking_index.sync_booking(conn, apartment_id, booking_id)
+        availability_calendar.sync_booking(conn, apartment_id, booking_id)
+    
+    @staticmethod
+    def _enqueue_events(conn, booking_id, status, outbox_events):
+        """Поставить события бронирования в outbox в транзакции записи"""
+        for target, payload in outbox_events or ():
+            outbox.enqueue(
+                conn, target, dict(payload, booking_id=booking_id),
+                f'{target}:booking:{booking_id}:{status}'
+            )
+    
+    @staticmethod
+    def _invalidate(apartment_id):
+        """Сбросить индексы квартиры (и учетных записей - гость мог быть создан), если транзакция записи не удалась.
+
+        Индексы обновляются до commit: без сброса откаченное бронирование осталось
+        бы в кэше с новой версией, которую позже может получить чужая запись.
+        """
+        booking_index.invalidate(apartment_id)
+        availability_calendar.invalidate(apartment_id)
+        principal_directory.invalidate()
+    
+    @staticmethod
+    def has_conflict(apartment_id, check_in_date, check_out_date):
+        """Есть ли активные бронирования, пересекающиеся с указанными датами"""
+        with get_connection() as conn:
+            return booking_index.has_conflict(conn, apartment_id, check_in_date, check_out_date)
+    
+    @staticmethod
+    def get_conflicting_ids(apartment_id, check_in_date, check_out_date):
+        """ID активных бронирований, пересекающихся с указанными датами"""
+        with get_connection() as conn:
+            return booking_index.find_conflicts(conn, apartment_id, check_in_date, check_out_date)
+    
+    @staticmethod
+    def get_occupancy(apartment_id, date_from, date_to):
+        """Занятость квартиры по ночам [date_from, date_to) из битовой карты"""
+        with get_connection() as conn:
+            return availability_calendar.occupancy(conn, apartment_id, date_from, date_to)
+    
     @staticmethod
     def get_bookings_for_apartment(apartment_id, active_only=True):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = 'SELECT * FROM bookings WHERE apartment_id = ?'
-        params = [apartment_id]
-        
-        if active_only:
-            query += ' AND status != ?'
-            params.append('cancelled')
-        
-        bookings = cursor.execute(query, params).fetchall()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+
+            query = 'SELECT * FROM bookings WHERE apartment_id = ?'
+            params = [apartment_id]
+
+            if active_only:
+                query += ' AND status != ?'
+                params.append('cancelled')
+
+            bookings = cursor.execute(query, params).fetchall()
         return bookings
     
     @staticmethod
     def get_user_bookings(user_id):
-        conn = get_db_connection()
-        bookings = conn.execute('SELECT * FROM bookings WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
-        conn.close()
+        with get_connection() as conn:
+            bookings = conn.execute('SELECT * FROM bookings WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
         return bookings
     
     @staticmethod
     def get_all():
-        conn = get_db_connection()
-        bookings = conn.execute('SELECT * FROM bookings').fetchall()
-        conn.close()
+        with get_connection() as conn:
+            bookings = conn.execute('SELECT * FROM bookings').fetchall()
         return bookings
 
 class Payment:
@@ -263,37 +434,35 @@ class Payment:
     
     @staticmethod
     def get_by_id(payment_id):
-        conn = get_db_connection()
-        payment = conn.execute('SELECT * FROM payments WHERE id = ?', (payment_id,)).fetchone()
-        conn.close()
+        with get_connection() as conn:
+            payment = conn.execute('SELECT * FROM payments WHERE id = ?', (payment_id,)).fetchone()
         return payment
     
     @staticmethod
+    @retry_on_locked
     def create(booking_id, amount, payment_method, transaction_id=None, status='pending'):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO payments (booking_id, amount, payment_method, transaction_id, status) VALUES (?, ?, ?, ?, ?)',
-            (booking_id, amount, payment_method, transaction_id, status)
-        )
-        conn.commit()
-        payment_id = cursor.lastrowid
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO payments (booking_id, amount, payment_method, transaction_id, status) VALUES (?, ?, ?, ?, ?)',
+                (booking_id, amount, payment_method, transaction_id, status)
+            )
+            conn.commit()
+            payment_id = cursor.lastrowid
         return payment_id
     
     @staticmethod
+    @retry_on_locked
     def update_status(payment_id, status):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE payments SET status = ? WHERE id = ?', (status, payment_id))
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE payments SET status = ? WHERE id = ?', (status, payment_id))
+            conn.commit()
+            success = cursor.rowcount > 0
         return success
     
     @staticmethod
     def get_by_booking_id(booking_id):
-        conn = get_db_connection()
-        payments = conn.execute('SELECT * FROM payments WHERE booking_id = ?', (booking_id,)).fetchall()
-        conn.close()
+        with get_connection() as conn:
+            payments = conn.execute('SELECT * FROM payments WHERE booking_id = ?', (booking_id,)).fetchall()
         return payments 
\ No newline at end of file
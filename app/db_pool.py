@@ -0,0 +1,160 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений SQLite.
+
+    Каждый поток получает соединение из пула и удерживает его, пока не
+    закончится запрос (или внешний контекст ``connection()``). Вложенные
+    вызовы ``connection()`` в том же потоке переиспользуют то же соединение,
+    поэтому все методы моделей в рамках одного HTTP-запроса работают через
+    одно соединение без повторных connect/close.
+    """
+
+    def __init__(self, db_path, pool_size=5, timeout=30.0, health_check_interval=30.0, on_connect=None):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Соединения нельзя наследовать через fork (gunicorn --preload),
+        # поэтому при смене процесса пул создается заново
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._local = threading.local()
+
+    def _create_connection(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.on_connect:
+            self.on_connect(conn)
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.pool_size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._create_connection()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"Нет свободных соединений в пуле (размер пула: {self.pool_size})"
+                    )
+                try:
+                    conn, last_used = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            # Проверяем соединение, которое долго простаивало
+            if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def _checkin(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put((conn, time.monotonic()))
+
+    def acquire(self):
+        """Получить соединение для текущего потока (с учетом вложенности)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+        local = self._local
+        if getattr(local, 'depth', 0) > 0:
+            local.depth += 1
+            return local.conn
+
+        conn = self._checkout()
+        local.conn = conn
+        local.depth = 1
+        return conn
+
+    def release(self):
+        """Вернуть соединение текущего потока в пул"""
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth <= 0:
+            return
+        local.depth = depth - 1
+        if local.depth == 0:
+            conn = local.conn
+            local.conn = None
+            try:
+                self._checkin(conn)
+            except sqlite3.Error:
+                self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Контекст запроса: соединение из пула, откат при исключении"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release()
+
+    def close_all(self):
+        """Закрыть все простаивающие соединения"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        """Текущее состояние пула (для диагностики)"""
+        return {
+            'pool_size': self.pool_size,
+            'created': self._created,
+            'idle': self._idle.qsize(),
+        }
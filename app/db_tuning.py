@@ -0,0 +1,102 @@
+import functools
+import logging
+import os
+import random
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Допустимые значения для PRAGMA, которые задаются строкой
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+
+
+def load_storage_settings():
+    """Настройки хранилища SQLite из переменных окружения"""
+    settings = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL').upper(),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper(),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),  # отрицательное значение - размер в КиБ
+        'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY').upper(),
+        'busy_timeout_ms': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'lock_retries': int(os.getenv('SQLITE_LOCK_RETRIES', 5)),
+        'lock_backoff': float(os.getenv('SQLITE_LOCK_BACKOFF', 0.05)),
+    }
+
+    if settings['journal_mode'] not in JOURNAL_MODES:
+        raise ValueError(f"Недопустимый SQLITE_JOURNAL_MODE: {settings['journal_mode']}")
+    if settings['synchronous'] not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Недопустимый SQLITE_SYNCHRONOUS: {settings['synchronous']}")
+    if settings['temp_store'] not in TEMP_STORES:
+        raise ValueError(f"Недопустимый SQLITE_TEMP_STORE: {settings['temp_store']}")
+
+    return settings
+
+
+# Настройки процесса; читаются один раз при импорте
+storage_settings = load_storage_settings()
+
+
+def apply_startup_pragmas(conn, settings=None):
+    """PRAGMA, которые сохраняются в файле БД (выполняется один раз при старте)"""
+    settings = settings or storage_settings
+    mode = conn.execute(f"PRAGMA journal_mode={settings['journal_mode']}").fetchone()[0]
+    if mode.upper() != settings['journal_mode']:
+        logger.warning(f"Не удалось включить journal_mode={settings['journal_mode']}, активен режим {mode}")
+    return mode
+
+
+def apply_connection_pragmas(conn, settings=None):
+    """PRAGMA, которые действуют в рамках одного соединения"""
+    settings = settings or storage_settings
+    conn.execute(f"PRAGMA busy_timeout={settings['busy_timeout_ms']}")
+    conn.execute(f"PRAGMA synchronous={settings['synchronous']}")
+    conn.execute(f"PRAGMA mmap_size={settings['mmap_size']}")
+    conn.execute(f"PRAGMA cache_size={settings['cache_size']}")
+    conn.execute(f"PRAGMA temp_store={settings['temp_store']}")
+    return conn
+
+
+def read_active_pragmas(conn):
+    """Фактические значения PRAGMA для соединения (для диагностики)"""
+    synchronous_names = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+    temp_store_names = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+    return {
+        'journal_mode': conn.execute('PRAGMA journal_mode').fetchone()[0].upper(),
+        'synchronous': synchronous_names.get(conn.execute('PRAGMA synchronous').fetchone()[0]),
+        'mmap_size': conn.execute('PRAGMA mmap_size').fetchone()[0],
+        'cache_size': conn.execute('PRAGMA cache_size').fetchone()[0],
+        'temp_store': temp_store_names.get(conn.execute('PRAGMA temp_store').fetchone()[0]),
+        'busy_timeout_ms': conn.execute('PRAGMA busy_timeout').fetchone()[0],
+    }
+
+
+def is_lock_error(error):
+    """Ошибка блокировки БД, которую имеет смысл повторить"""
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_locked(func):
+    """Повторяет операцию записи при 'database is locked' с экспоненциальной задержкой"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = storage_settings['lock_retries']
+        backoff = storage_settings['lock_backoff']
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e) or attempt >= retries:
+                    raise
+                delay = backoff * (2 ** attempt) * (1 + random.random())
+                attempt += 1
+                logger.warning(
+                    f"БД заблокирована в {func.__qualname__}, попытка {attempt}/{retries} через {delay:.3f} с"
+                )
+                time.sleep(delay)
+    return wrapper
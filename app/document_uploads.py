@@ -0,0 +1,98 @@
+import logging
+import os
+import uuid
+
+from app import outbox
+
+logger = logging.getLogger(__name__)
+
+# Каталог, куда загрузки сохраняются до отправки в Google Drive
+UPLOAD_SPOOL_DIR = os.getenv(
+    'UPLOAD_SPOOL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'uploads')
+)
+# Размер части resumable-загрузки; Drive требует кратность 256 КБ
+DRIVE_CHUNK_ALIGNMENT = 256 * 1024
+DRIVE_UPLOAD_CHUNK_SIZE = max(
+    DRIVE_CHUNK_ALIGNMENT,
+    int(os.getenv('DRIVE_UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024)) // DRIVE_CHUNK_ALIGNMENT * DRIVE_CHUNK_ALIGNMENT
+)
+# Буфер копирования загружаемого файла на диск
+SPOOL_BUFFER_SIZE = 64 * 1024
+
+# Статусы загрузки фото документа пользователя
+DOCUMENT_PENDING = 'pending'
+DOCUMENT_UPLOADED = 'uploaded'
+
+OUTBOX_TARGET = 'drive_upload'
+
+
+def spool_upload(file_storage, prefix):
+    """Сохранить загруженный файл в спул потоково, не читая его целиком в память"""
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    name = f"{prefix}_{uuid.uuid4().hex}"
+    path = os.path.join(UPLOAD_SPOOL_DIR, name)
+    tmp_path = path + '.part'
+    try:
+        with open(tmp_path, 'wb') as spool_file:
+            file_storage.save(spool_file, buffer_size=SPOOL_BUFFER_SIZE)
+        # Файл появляется под итоговым именем только полностью записанным
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def enqueue_document_upload(user_id, spool_path, filename, mimetype='image/jpeg'):
+    """Поставить фото документа в очередь на загрузку в Google Drive"""
+    payload = {
+        'user_id': user_id,
+        'spool_path': spool_path,
+        'filename': filename,
+        'mimetype': mimetype
+    }
+    return outbox.enqueue_now(OUTBOX_TARGET, payload, f"{OUTBOX_TARGET}:user:{user_id}:{os.path.basename(spool_path)}")
+
+
+def upload_file_to_drive(path, filename, mimetype='image/jpeg'):
+    """Загрузка файла с диска в Google Drive частями (resumable upload)"""
+    from googleapiclient.http import MediaFileUpload
+    from app.google_clients import google_clients, DRIVE_FILE_SCOPES
+
+    service = google_clients.get_service('drive', 'v3', DRIVE_FILE_SCOPES)
+    media = MediaFileUpload(path, mimetype=mimetype, chunksize=DRIVE_UPLOAD_CHUNK_SIZE, resumable=True)
+    request = service.files().create(body={'name': filename}, media_body=media, fields='id')
+
+    response = None
+    while response is None:
+        status, response = request.next_chunk(num_retries=3)
+        if status:
+            logger.info(f"Загрузка {filename} в Google Drive: {int(status.progress() * 100)}%")
+
+    # Устанавливаем публичный доступ
+    service.permissions().create(
+        fileId=response.get('id'),
+        body={'role': 'reader', 'type': 'anyone'}
+    ).execute()
+
+    return f"https://drive.google.com/uc?id={response.get('id')}"
+
+
+def deliver_document_upload(payload, idempotency_key):
+    """Обработчик outbox: загрузить файл из спула и записать ссылку пользователю"""
+    from app.database import User
+
+    spool_path = payload['spool_path']
+    if not os.path.exists(spool_path):
+        user = User.get_by_id(payload['user_id'])
+        if user is not None and user['document_photo_url']:
+            # Файл уже загружен при предыдущей попытке
+            return
+        raise FileNotFoundError(f"Файл загрузки не найден: {spool_path}")
+
+    photo_url = upload_file_to_drive(spool_path, payload['filename'], payload.get('mimetype', 'image/jpeg'))
+    User.update(payload['user_id'], document_photo_url=photo_url, document_status=DOCUMENT_UPLOADED)
+    os.remove(spool_path)
+    logger.info(f"Фото документа пользователя {payload['user_id']} загружено: {photo_url}")
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Файл сервисного аккаунта по умолчанию (как в sheets_integration)
+DEFAULT_CREDENTIALS_FILE = 'quick-flame-437017-e6-53c51b17c354.json'
+# За сколько секунд до истечения токен обновляется заранее
+GOOGLE_TOKEN_REFRESH_MARGIN = float(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN', 300))
+# Прогревать клиенты при старте воркера
+GOOGLE_WARMUP_ENABLED = os.getenv('GOOGLE_WARMUP_ENABLED', 'true').lower() == 'true'
+
+# Области доступа интеграций
+SHEETS_SCOPES = ('https://www.googleapis.com/auth/spreadsheets',)
+DRIVE_FILE_SCOPES = ('https://www.googleapis.com/auth/drive.file',)
+GSPREAD_SCOPES = (
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive',
+)
+
+
+def resolve_credentials_path():
+    """Путь к файлу сервисного аккаунта из GOOGLE_CREDENTIALS_FILE.
+
+    Имя можно указать с расширением .json или без него, абсолютным путем
+    или относительно текущей директории либо корня проекта.
+    """
+    credentials_file = os.getenv('GOOGLE_CREDENTIALS_FILE') or DEFAULT_CREDENTIALS_FILE
+    names = [credentials_file]
+    if not credentials_file.endswith('.json'):
+        names.append(credentials_file + '.json')
+
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for name in names:
+        for path in (name, os.path.join(base_path, name)):
+            if os.path.exists(path):
+                return path
+
+    logger.error(f"Файл учетных данных не найден: {credentials_file}")
+    raise FileNotFoundError(f"Credentials file not found: {credentials_file}")
+
+
+class GoogleClientFactory:
+    """Общие для процесса учетные данные и клиенты Google API.
+
+    Учетные данные читаются с диска один раз на набор областей доступа и
+    обновляются заранее, до истечения токена. Клиенты googleapiclient
+    (build() разбирает большой discovery-документ) создаются один раз на
+    API и набор областей; транспорт httplib2 не потокобезопасен, поэтому
+    запросы каждого потока идут через его собственный транспорт.
+    Клиент gspread один на процесс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials = {}
+        self._refresh_locks = {}
+        self._services = {}
+        self._gspread_client = None
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._warm_up_pid = None
+
+    def _check_pid(self):
+        # После fork кэш родителя не используем: соединения нельзя делить между процессами
+        if self._pid != os.getpid():
+            self._credentials = {}
+            self._refresh_locks = {}
+            self._services = {}
+            self._gspread_client = None
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+    def get_credentials(self, scopes):
+        """Учетные данные сервисного аккаунта с действующим токеном"""
+        from google.oauth2 import service_account
+
+        scopes = tuple(scopes)
+        with self._lock:
+            self._check_pid()
+            credentials = self._credentials.get(scopes)
+            if credentials is None:
+                credentials = service_account.Credentials.from_service_account_file(
+                    resolve_credentials_path(),
+                    scopes=list(scopes)
+                )
+                self._credentials[scopes] = credentials
+                self._refresh_locks[scopes] = threading.Lock()
+            refresh_lock = self._refresh_locks[scopes]
+
+        if self._needs_refresh(credentials):
+            with refresh_lock:
+                # Токен мог обновить другой поток, пока мы ждали блокировку
+                if self._needs_refresh(credentials):
+                    from google.auth.transport.requests import Request
+                    credentials.refresh(Request())
+                    logger.info(f"Обновлен токен Google API, действует до {credentials.expiry}")
+        return credentials
+
+    @staticmethod
+    def _needs_refresh(credentials):
+        if not credentials.token or credentials.expiry is None:
+            return True
+        # expiry в google-auth хранится как naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return credentials.expiry - timedelta(seconds=GOOGLE_TOKEN_REFRESH_MARGIN) <= now
+
+    def _thread_http(self, scopes):
+        """Авторизованный транспорт httplib2 текущего потока для набора областей"""
+        import google_auth_httplib2
+        import httplib2
+
+        https = getattr(self._local, 'https', None)
+        if https is None:
+            https = self._local.https = {}
+        http = https.get(scopes)
+        if http is None:
+            http = https[scopes] = google_auth_httplib2.AuthorizedHttp(
+                self.get_credentials(scopes), http=httplib2.Http()
+            )
+        return http
+
+    def get_service(self, api, version, scopes):
+        """Клиент googleapiclient для API (один на процесс)"""
+        from googleapiclient.discovery import build
+        from googleapiclient.http import HttpRequest
+
+        scopes = tuple(scopes)
+        key = (api, version, scopes)
+        credentials = self.get_credentials(scopes)
+        with self._lock:
+            self._check_pid()
+            service = self._services.get(key)
+        if service is not None:
+            return service
+
+        def build_request(http, *args, **kwargs):
+            # Токен обновляем заранее, запрос выполняем через транспорт своего потока
+            self.get_credentials(scopes)
+            return HttpRequest(self._thread_http(scopes), *args, **kwargs)
+
+        service = build(
+            api, version,
+            credentials=credentials,
+            requestBuilder=build_request,
+            cache_discovery=False
+        )
+        with self._lock:
+            return self._services.setdefault(key, service)
+
+    def get_gspread_client(self, scopes=GSPREAD_SCOPES):
+        """Клиент gspread процесса"""
+        import gspread
+
+        credentials = self.get_credentials(scopes)
+        with self._lock:
+            self._check_pid()
+            if self._gspread_client is None:
+                self._gspread_client = gspread.authorize(credentials)
+            return self._gspread_client
+
+    def warm_up(self):
+        """Прочитать учетные данные, получить токены и собрать клиенты заранее"""
+        try:
+            self.get_service('sheets', 'v4', SHEETS_SCOPES)
+            self.get_service('drive', 'v3', DRIVE_FILE_SCOPES)
+            logger.info('Клиенты Google API подготовлены')
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить клиенты Google API: {e}")
+
+    def start_warm_up(self):
+        """Прогрев в фоновом потоке, чтобы не задерживать старт воркера (один раз на процесс)"""
+        if not GOOGLE_WARMUP_ENABLED:
+            return
+        with self._lock:
+            if self._warm_up_pid == os.getpid():
+                return
+            self._warm_up_pid = os.getpid()
+        threading.Thread(target=self.warm_up, name='google-warm-up', daemon=True).start()
+
+    def reset(self):
+        """Сбросить кэш (например, после замены файла учетных данных)"""
+        with self._lock:
+            self._credentials = {}
+            self._refresh_locks = {}
+            self._services = {}
+            self._gspread_client = None
+            self._local = threading.local()
+
+
+# Фабрика клиентов Google процесса
+google_clients = GoogleClientFactory()
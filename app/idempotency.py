@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import logging
+import os
+import time
+
+from flask import g, jsonify, request
+
+from app import app, get_pooled_connection
+from app.db_tuning import retry_on_locked
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# Сколько хранится ответ на запрос с ключом, секунд
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 86400))
+# Сколько ключ считается занятым выполняющимся запросом (на случай падения воркера)
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 60))
+# Как часто удалять просроченные ключи, секунд
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', 300))
+MAX_KEY_LENGTH = 255
+
+STATUS_PROCESSING = 'processing'
+STATUS_COMPLETED = 'completed'
+
+_last_purge = 0.0
+
+
+def key_digest(scope, key, caller=None):
+    """Ключ в таблице: 16 байт хеша вместо строки клиента, чтобы индекс оставался компактным.
+
+    caller - Telegram ID из проверенной сессии: совпавшие ключи разных
+    пользователей не пересекаются и не отдают чужой ответ.
+    """
+    return hashlib.sha256(f'{scope}\0{caller or ""}\0{key}'.encode('utf-8')).digest()[:16]
+
+
+def request_fingerprint(body):
+    return hashlib.sha256(body).digest()[:16]
+
+
+@retry_on_locked
+def claim(digest, fingerprint):
+    """Занять ключ; возвращает None или сохраненную строку, если ключ уже использован"""
+    now = time.time()
+    with get_pooled_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            'SELECT status, fingerprint, response_status, response_body, mimetype '
+            'FROM idempotency_keys WHERE key_hash = ? AND expires_at > ?',
+            (digest, now)
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                'INSERT OR REPLACE INTO idempotency_keys (key_hash, fingerprint, status, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (digest, fingerprint, STATUS_PROCESSING, now + IDEMPOTENCY_LOCK_SECONDS)
+            )
+        conn.commit()
+    return row
+
+
+@retry_on_locked
+def complete(digest, response):
+    with get_pooled_connection() as conn:
+        conn.execute(
+            'UPDATE idempotency_keys SET status = ?, response_status = ?, response_body = ?, mimetype = ?, '
+            'expires_at = ? WHERE key_hash = ?',
+            (STATUS_COMPLETED, response.status_code, response.get_data(), response.mimetype,
+             time.time() + IDEMPOTENCY_TTL, digest)
+        )
+        conn.commit()
+
+
+@retry_on_locked
+def release(digest):
+    """Освободить ключ, чтобы повтор выполнил запрос заново (ответ 5xx или исключение)"""
+    with get_pooled_connection() as conn:
+        conn.execute('DELETE FROM idempotency_keys WHERE key_hash = ?', (digest,))
+        conn.commit()
+
+
+def purge_expired(force=False):
+    """Удалить просроченные ключи (не чаще IDEMPOTENCY_PURGE_INTERVAL)"""
+    global _last_purge
+    now = time.time()
+    if not force and now - _last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+        return 0
+    _last_purge = now
+    with get_pooled_connection() as conn:
+        deleted = conn.execute('DELETE FROM idempotency_keys WHERE expires_at <= ?', (now,)).rowcount
+        conn.commit()
+    if deleted:
+        logger.info(f"Удалено просроченных ключей идемпотентности: {deleted}")
+    return deleted
+
+
+def idempotent(scope):
+    """Декоратор маршрута: повтор запроса с тем же Idempotency-Key возвращает сохраненный ответ.
+
+    Повтор не выполняет проверки, запись в БД и постановку синхронизации
+    заново. Ключ с другим телом запроса - 422, ключ выполняющегося
+    запроса - 409. Ответы 5xx не сохраняются, чтобы повтор мог выполниться.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} is too long'}), 400
+
+            # Сессия Mini App проверяется декоратором webapp_user до этого декоратора
+            webapp_user = g.get('webapp_user')
+            digest = key_digest(scope, key, webapp_user['telegram_id'] if webapp_user else None)
+            fingerprint = request_fingerprint(request.get_data())
+            row = claim(digest, fingerprint)
+            if row is not None:
+                if row['fingerprint'] != fingerprint:
+                    return jsonify({'error': f'{IDEMPOTENCY_HEADER} was used with a different request'}), 422
+                if row['status'] != STATUS_COMPLETED:
+                    return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+                logger.info(f"Повтор запроса {scope} с ключом идемпотентности, возвращаем сохраненный ответ")
+                response = app.response_class(
+                    row['response_body'], status=row['response_status'], mimetype=row['mimetype']
+                )
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                release(digest)
+                raise
+
+            if response.status_code >= 500:
+                release(digest)
+            else:
+                complete(digest, response)
+            purge_expired()
+            return response
+        return wrapper
+    return decorator
+
@@ -0,0 +1,358 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Настройки доставки сообщений во внешние системы
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'true').lower() == 'true'
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+# Сколько сообщений назначения с поштучной доставкой захватывать за проход;
+# для пакетных обработчиков захватывается их batch_size
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 20))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', 2))
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 600))
+OUTBOX_LEASE_SECONDS = float(os.getenv('OUTBOX_LEASE_SECONDS', 120))
+# Сколько ждать после нового сообщения, чтобы собрать всплеск в одну пачку
+OUTBOX_COALESCE_WINDOW = float(os.getenv('OUTBOX_COALESCE_WINDOW', 1.0))
+
+# Статусы сообщений
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_DEAD = 'dead'
+
+# Обработчики по назначению: target -> (func, batch_size).
+# При batch_size == 1 вызывается func(payload, idempotency_key),
+# иначе func([(payload, idempotency_key), ...]) для пачки сообщений.
+_handlers = {}
+
+
+def register_handler(target, handler, batch_size=1):
+    """Зарегистрировать обработчик доставки для назначения"""
+    _handlers[target] = (handler, batch_size)
+
+
+def _default_handlers():
+    """Обработчики внешних интеграций (импортируются при первой доставке)"""
+    if 'airtable' not in _handlers:
+        try:
+            from app.airtable_integration import add_bookings_to_airtable, AIRTABLE_MAX_RECORDS_PER_REQUEST
+        except ImportError as e:
+            logger.warning(f"Интеграция с Airtable недоступна: {e}")
+        else:
+            def deliver_to_airtable(messages):
+                add_bookings_to_airtable([payload for payload, _ in messages])
+
+            # Одна пачка outbox - один запрос к Airtable, чтобы повтор не дублировал записи
+            register_handler('airtable', deliver_to_airtable, batch_size=AIRTABLE_MAX_RECORDS_PER_REQUEST)
+
+    if 'google_sheets' not in _handlers:
+        try:
+            from app.sheets_integration import update_google_sheets_batch, SHEETS_BATCH_SIZE
+        except ImportError as e:
+            logger.warning(f"Интеграция с Google Sheets недоступна: {e}")
+        else:
+            def deliver_to_google_sheets(messages):
+                update_google_sheets_batch([payload for payload, _ in messages])
+
+            register_handler('google_sheets', deliver_to_google_sheets, batch_size=SHEETS_BATCH_SIZE)
+
+    if 'drive_upload' not in _handlers:
+        try:
+            from app.document_uploads import deliver_document_upload
+        except ImportError as e:
+            logger.warning(f"Загрузка документов в Google Drive недоступна: {e}")
+        else:
+            register_handler('drive_upload', deliver_document_upload)
+
+    if 'bot_events' not in _handlers:
+        from app.bot_events import deliver_bot_event
+        register_handler('bot_events', deliver_bot_event)
+
+
+def enqueue(conn, target, payload, idempotency_key):
+    """Поставить сообщение в outbox в транзакции вызывающего кода.
+
+    Повторная постановка с тем же ключом идемпотентности игнорируется.
+    Commit выполняет вызывающий код вместе с основной записью, после чего
+    нужно вызвать dispatcher.wake(), чтобы доставка началась сразу.
+    """
+    cursor = conn.execute(
+        'INSERT OR IGNORE INTO outbox (idempotency_key, target, payload, status, next_attempt_at) VALUES (?, ?, ?, ?, ?)',
+        (idempotency_key, target, json.dumps(payload, ensure_ascii=False, default=str), STATUS_PENDING, time.time())
+    )
+    return cursor.rowcount > 0
+
+
+def enqueue_now(target, payload, idempotency_key):
+    """Поставить сообщение в outbox отдельной транзакцией и разбудить обработчик"""
+    with _get_connection() as conn:
+        added = enqueue(conn, target, payload, idempotency_key)
+        conn.commit()
+    dispatcher.wake()
+    return added
+
+
+def backoff_delay(attempts):
+    """Экспоненциальная задержка перед повтором с разбросом"""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return delay * (0.5 + random.random() / 2)
+
+
+def _error_status(error):
+    """HTTP-статус ошибки клиента (AirtableError, requests, googleapiclient) или None"""
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status
+    for attribute, status_attribute in (('response', 'status_code'), ('resp', 'status')):
+        response = getattr(error, attribute, None)
+        status = getattr(response, status_attribute, None) if response is not None else None
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def _transport_errors():
+    """Классы сетевых ошибок: встроенные и уже загруженных клиентов (их не импортируем ради проверки)"""
+    errors = [ConnectionError, TimeoutError]
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        errors += [requests.ConnectionError, requests.Timeout]
+    httplib2 = sys.modules.get('httplib2')
+    if httplib2 is not None:
+        errors.append(httplib2.ServerNotFoundError)
+    return tuple(errors)
+
+
+def is_outage(error):
+    """Ошибка означает недоступность сервиса (сеть, 429, 5xx), а не плохое сообщение.
+
+    Проверяется и цепочка __cause__: обработчики оборачивают ошибки клиентов в свои.
+    """
+    while error is not None:
+        status = _error_status(error)
+        if status is not None:
+            return status == 429 or status >= 500
+        if isinstance(error, _transport_errors()):
+            return True
+        error = error.__cause__
+    return False
+
+
+def _get_connection():
+    from app import get_pooled_connection
+    return get_pooled_connection()
+
+
+class OutboxDispatcher:
+    """Фоновая доставка сообщений outbox с повторами и dead-letter.
+
+    Сообщения захватываются в транзакции BEGIN IMMEDIATE с арендой на
+    OUTBOX_LEASE_SECONDS, поэтому несколько воркеров gunicorn не доставляют
+    одно сообщение одновременно, а сообщения упавшего воркера возвращаются в
+    очередь после истечения аренды.
+    """
+
+    def __init__(self):
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Последний проход захватил полную пачку хотя бы одного назначения - очередь не разобрана
+        self._backlog = False
+
+    def start(self):
+        """Запустить поток доставки в текущем процессе (повторный вызов ничего не делает)"""
+        if not OUTBOX_ENABLED:
+            return
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+            self._thread.start()
+            logger.info('Запущен обработчик outbox')
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        self._wake_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.dispatch_once()
+            except Exception:
+                logger.exception('Ошибка в обработчике outbox')
+                self._backlog = False
+            if not self._backlog:
+                woken = self._wake_event.wait(OUTBOX_POLL_INTERVAL)
+                self._wake_event.clear()
+                if woken and OUTBOX_COALESCE_WINDOW > 0:
+                    self._stop_event.wait(OUTBOX_COALESCE_WINDOW)
+
+    @staticmethod
+    def _claim_limit(target):
+        """Сколько сообщений назначения захватывать: пачка обработчика или OUTBOX_BATCH_SIZE"""
+        batch_size = _handlers.get(target, (None, 1))[1]
+        return batch_size if batch_size > 1 else OUTBOX_BATCH_SIZE
+
+    def _claim(self, limit=None):
+        """Захватить готовые сообщения - отдельно по каждому назначению, до его размера пачки"""
+        now = time.time()
+        ready = 'status IN (?, ?) AND next_attempt_at <= ?'
+        with _get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            targets = [
+                row[0] for row in conn.execute(
+                    f'SELECT DISTINCT target FROM outbox WHERE {ready}', (STATUS_PENDING, STATUS_PROCESSING, now)
+                )
+            ]
+            rows = []
+            self._backlog = False
+            for target in targets:
+                target_limit = limit or self._claim_limit(target)
+                target_rows = conn.execute(
+                    f'SELECT id, idempotency_key, target, payload, attempts FROM outbox '
+                    f'WHERE {ready} AND target = ? ORDER BY id LIMIT ?',
+                    (STATUS_PENDING, STATUS_PROCESSING, now, target, target_limit)
+                ).fetchall()
+                self._backlog = self._backlog or len(target_rows) == target_limit
+                rows.extend(target_rows)
+            if rows:
+                conn.executemany(
+                    'UPDATE outbox SET status = ?, next_attempt_at = ? WHERE id = ?',
+                    [(STATUS_PROCESSING, now + OUTBOX_LEASE_SECONDS, row['id']) for row in rows]
+                )
+            conn.commit()
+        return rows
+
+    def _finish(self, message_id, status, attempts, next_attempt_at=None, error=None):
+        with _get_connection() as conn:
+            conn.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, '
+                'updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (status, attempts, next_attempt_at or 0, error, message_id)
+            )
+            conn.commit()
+
+    def _fail(self, row, error):
+        attempts = row['attempts'] + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"Сообщение outbox {row['idempotency_key']} перемещено в dead-letter: {error}")
+            self._finish(row['id'], STATUS_DEAD, attempts, error=str(error))
+        else:
+            delay = backoff_delay(attempts)
+            logger.warning(
+                f"Ошибка доставки {row['idempotency_key']} (попытка {attempts}), повтор через {delay:.0f} с: {error}"
+            )
+            self._finish(row['id'], STATUS_PENDING, attempts, time.time() + delay, str(error))
+
+    def _deliver(self, target, rows):
+        handler, batch_size = _handlers.get(target, (None, 1))
+        if handler is None:
+            for row in rows:
+                self._fail(row, LookupError(f"Нет обработчика для назначения {target}"))
+            return
+
+        # Пакетные обработчики получают сообщения пачками, остальные - по одному
+        if batch_size > 1:
+            for i in range(0, len(rows), batch_size):
+                chunk = rows[i:i + batch_size]
+                error = self._send_batch(handler, chunk)
+                if error is not None:
+                    self._bisect(handler, chunk, error)
+            return
+
+        for row in rows:
+            try:
+                handler(json.loads(row['payload']), row['idempotency_key'])
+            except Exception as e:
+                self._fail(row, e)
+            else:
+                self._done([row])
+
+    def _done(self, rows):
+        for row in rows:
+            logger.info(f"Сообщение outbox {row['idempotency_key']} доставлено")
+            self._finish(row['id'], STATUS_DONE, row['attempts'] + 1)
+
+    def _send_batch(self, handler, chunk):
+        """Отправить пачку; возвращает исключение или None, если пачка доставлена"""
+        try:
+            handler([(json.loads(row['payload']), row['idempotency_key']) for row in chunk])
+        except Exception as e:
+            return e
+        self._done(chunk)
+        return None
+
+    def _bisect(self, handler, chunk, error):
+        """Пачка не доставлена: делим пополам, чтобы плохие сообщения не тянули остальные в dead-letter.
+
+        Деление идет до отдельных сообщений, ошибку получают только те, что
+        не доставлены поодиночке. Недоступность сервиса (is_outage) - не вина
+        сообщений: деление прекращается, чтобы не умножать запросы, и повтор
+        получают все сообщения пачки.
+        """
+        if len(chunk) == 1 or is_outage(error):
+            for row in chunk:
+                self._fail(row, error)
+            return
+
+        middle = len(chunk) // 2
+        for half in (chunk[:middle], chunk[middle:]):
+            half_error = self._send_batch(handler, half)
+            if half_error is not None:
+                self._bisect(handler, half, half_error)
+
+    def dispatch_once(self, limit=None):
+        """Доставить готовые к отправке сообщения; возвращает их количество"""
+        _default_handlers()
+        rows = self._claim(limit)
+
+        by_target = {}
+        for row in rows:
+            by_target.setdefault(row['target'], []).append(row)
+        for target, target_rows in by_target.items():
+            self._deliver(target, target_rows)
+
+        return len(rows)
+
+
+def stats(conn):
+    """Количество сообщений outbox по статусам"""
+    return {
+        row[0]: row[1]
+        for row in conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status')
+    }
+
+
+def retry_dead(conn, target=None):
+    """Вернуть сообщения из dead-letter в очередь"""
+    query = 'UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?'
+    params = [STATUS_PENDING, time.time(), STATUS_DEAD]
+    if target:
+        query += ' AND target = ?'
+        params.append(target)
+    count = conn.execute(query, params).rowcount
+    conn.commit()
+    dispatcher.wake()
+    return count
+
+
+# Обработчик outbox процесса
+dispatcher = OutboxDispatcher()
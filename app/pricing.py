@@ -0,0 +1,237 @@
+import os
+import threading
+from datetime import date
+from itertools import accumulate
+
+from app.booking_index import to_night
+
+# На сколько дней вперед цены ночей считаются заранее (префиксные суммы)
+PRICING_HORIZON_DAYS = int(os.getenv('PRICING_HORIZON_DAYS', 730))
+
+# Типы правил ценообразования (таблица pricing_rules)
+RULE_NIGHTLY = 'nightly'  # множитель цены ночей: сезон (start_date/end_date) и/или дни недели (weekdays)
+RULE_LENGTH_OF_STAY = 'length_of_stay'  # множитель итоговой суммы при проживании от min_nights ночей
+
+
+class PricingError(ValueError):
+    """Некорректный запрос на расчет стоимости"""
+
+
+class PricingRule:
+    """Правило ценообразования из таблицы pricing_rules"""
+
+    __slots__ = ('apartment_id', 'rule_type', 'start', 'end', 'weekdays', 'min_nights', 'multiplier')
+
+    def __init__(self, row):
+        self.apartment_id = row['apartment_id']
+        self.rule_type = row['rule_type']
+        self.start = to_night(row['start_date']) if row['start_date'] else None
+        self.end = to_night(row['end_date']) if row['end_date'] else None
+        # Дни недели ночей: 0 - понедельник ... 6 - воскресенье; "4,5" - ночи пятницы и субботы
+        self.weekdays = frozenset(int(day) for day in row['weekdays'].split(',')) if row['weekdays'] else None
+        self.min_nights = row['min_nights'] or 0
+        self.multiplier = row['multiplier']
+
+    def applies_to_night(self, night):
+        if self.start is not None and night < self.start:
+            return False
+        if self.end is not None and night >= self.end:
+            return False
+        # date.fromordinal(1) - понедельник, поэтому день недели - (night - 1) % 7
+        return self.weekdays is None or (night - 1) % 7 in self.weekdays
+
+
+class ApartmentPricing:
+    """Цены ночей одной квартиры.
+
+    Цены ночей на горизонт PRICING_HORIZON_DAYS считаются один раз и хранятся
+    как префиксные суммы, поэтому стоимость любого периода внутри горизонта -
+    разность двух элементов массива, без перебора ночей.
+    """
+
+    __slots__ = ('apartment_id', 'base_price', 'nightly_rules', 'stay_rules', 'first_night', 'prefix')
+
+    def __init__(self, apartment_id, base_price, rules, first_night, horizon=PRICING_HORIZON_DAYS):
+        self.apartment_id = apartment_id
+        self.base_price = base_price
+        self.nightly_rules = [rule for rule in rules if rule.rule_type == RULE_NIGHTLY]
+        # Правила длительности от большего порога к меньшему: применяется первое подходящее
+        self.stay_rules = sorted(
+            (rule for rule in rules if rule.rule_type == RULE_LENGTH_OF_STAY),
+            key=lambda rule: rule.min_nights,
+            reverse=True
+        )
+        self.first_night = first_night
+        self.prefix = [0.0] + list(accumulate(
+            self.night_price(night) for night in range(first_night, first_night + horizon)
+        ))
+
+    def night_price(self, night):
+        price = self.base_price
+        for rule in self.nightly_rules:
+            if rule.applies_to_night(night):
+                price *= rule.multiplier
+        return price
+
+    def nights_total(self, start, end):
+        """Сумма цен ночей [start, end)"""
+        last_night = self.first_night + len(self.prefix) - 1
+        if start >= self.first_night and end <= last_night:
+            return self.prefix[end - self.first_night] - self.prefix[start - self.first_night]
+        return sum(self.night_price(night) for night in range(start, end))
+
+    def stay_multiplier(self, nights):
+        for rule in self.stay_rules:
+            if nights >= rule.min_nights:
+                return rule.multiplier
+        return 1.0
+
+    def quote(self, start, end):
+        nights = end - start
+        subtotal = self.nights_total(start, end)
+        total = subtotal * self.stay_multiplier(nights)
+        return {
+            'apartment_id': self.apartment_id,
+            'check_in_date': date.fromordinal(start).isoformat(),
+            'check_out_date': date.fromordinal(end).isoformat(),
+            'num_days': nights,
+            'price_per_day': self.base_price,
+            'subtotal': round(subtotal),
+            'total_price': round(total)
+        }
+
+
+class PricingEngine:
+    """Расчет стоимости проживания - единый источник цен для котировок и бронирований.
+
+    Базовые цены квартир и правила из pricing_rules загружаются в память и
+    используются, пока не изменились версии каталога квартир
+    (apartment_catalog_version) и правил (pricing_rules_version), которые
+    увеличиваются триггерами, в том числе при записи из других воркеров.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._prices = {}
+        self._rules = {}
+        self._apartments = {}
+
+    @staticmethod
+    def current_version(conn):
+        row = conn.execute(
+            'SELECT (SELECT version FROM apartment_catalog_version WHERE id = 1), '
+            '(SELECT version FROM pricing_rules_version WHERE id = 1)'
+        ).fetchone()
+        # Горизонт цен отсчитывается от сегодняшнего дня, поэтому дата - часть версии
+        return (row[0], row[1], date.today().toordinal())
+
+    def _load(self, conn, version):
+        prices = {row[0]: row[1] for row in conn.execute('SELECT id, price_per_day FROM apartments')}
+        rules = {}
+        for row in conn.execute('SELECT * FROM pricing_rules ORDER BY id'):
+            rules.setdefault(row['apartment_id'], []).append(PricingRule(row))
+        with self._lock:
+            self._version = version
+            self._prices = prices
+            self._rules = rules
+            self._apartments = {}
+
+    def get(self, conn, apartment_id, version=None):
+        """Цены квартиры; None, если квартиры нет"""
+        version = version or self.current_version(conn)
+        with self._lock:
+            loaded = self._version == version
+        if not loaded:
+            self._load(conn, version)
+
+        with self._lock:
+            pricing = self._apartments.get(apartment_id)
+            if pricing is not None:
+                return pricing
+            base_price = self._prices.get(apartment_id)
+            if base_price is None:
+                return None
+            # Общие правила (apartment_id IS NULL) и правила квартиры
+            rules = self._rules.get(None, []) + self._rules.get(apartment_id, [])
+            pricing = ApartmentPricing(apartment_id, base_price, rules, version[2] - 1)
+            self._apartments[apartment_id] = pricing
+            return pricing
+
+    @staticmethod
+    def _apartment_id(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise PricingError('Invalid apartment_id')
+
+    @staticmethod
+    def _nights(check_in_date, check_out_date):
+        try:
+            start, end = to_night(check_in_date), to_night(check_out_date)
+        except (TypeError, ValueError):
+            raise PricingError('Invalid date format. Use YYYY-MM-DD')
+        if end <= start:
+            raise PricingError('Check-out date must be after check-in date')
+        return start, end
+
+    def quote(self, conn, apartment_id, check_in_date, check_out_date):
+        """Стоимость проживания; None, если квартиры нет"""
+        start, end = self._nights(check_in_date, check_out_date)
+        pricing = self.get(conn, self._apartment_id(apartment_id))
+        return pricing.quote(start, end) if pricing is not None else None
+
+    def quote_many(self, conn, items):
+        """Стоимость для списка (apartment_id, check_in_date, check_out_date) за один проход.
+
+        Версия проверяется один раз на весь список, каждая дата и квартира
+        разбираются один раз, даже если повторяются в нескольких элементах.
+        Для каждого элемента возвращается котировка, None (квартиры нет)
+        или PricingError.
+        """
+        version = self.current_version(conn)
+        nights = {}
+        apartments = {}
+
+        def night(value):
+            try:
+                return nights[value]
+            except KeyError:
+                pass
+            except TypeError:
+                # Нехешируемое значение из JSON (список, объект) - не дата
+                return None
+            try:
+                nights[value] = to_night(value)
+            except (TypeError, ValueError):
+                nights[value] = None
+            return nights[value]
+
+        results = []
+        for apartment_id, check_in_date, check_out_date in items:
+            start, end = night(check_in_date), night(check_out_date)
+            if start is None or end is None:
+                results.append(PricingError('Invalid date format. Use YYYY-MM-DD'))
+                continue
+            if end <= start:
+                results.append(PricingError('Check-out date must be after check-in date'))
+                continue
+            try:
+                key = self._apartment_id(apartment_id)
+            except PricingError as e:
+                results.append(e)
+                continue
+            if key not in apartments:
+                apartments[key] = self.get(conn, key, version)
+            pricing = apartments[key]
+            results.append(pricing.quote(start, end) if pricing is not None else None)
+        return results
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._apartments = {}
+
+
+# Расчет цен процесса
+pricing_engine = PricingEngine()
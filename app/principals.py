@@ -0,0 +1,116 @@
+import threading
+
+# Виды учетных записей в таблице principals
+KIND_USER = 'user'
+KIND_OWNER = 'owner'
+
+# Если у telegram_id есть и пользователь, и владелец, используется пользователь
+KIND_PRIORITY = (KIND_USER, KIND_OWNER)
+
+
+def principal_to_dict(row):
+    """Строка principals в словарь, совместимый с ответами API"""
+    return {
+        'role': row['kind'],
+        'id': row['principal_id'],
+        'telegram_id': row['telegram_id'],
+        'username': row['username'],
+        'full_name': row['full_name'],
+        'is_verified': bool(row['is_verified']),
+        'registered_at': row['registered_at']
+    }
+
+
+class PrincipalDirectory:
+    """Процессная хеш-таблица telegram_id -> пользователь или владелец.
+
+    Таблицу principals заполняют триггеры на users и owners, они же
+    увеличивают principals_version. Запись из этого процесса обновляет
+    таблицу сразу (write-through в транзакции записи), запись из других
+    воркеров приводит к перечитыванию при следующем обращении.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_telegram_id = {}  # telegram_id -> {kind: principal}
+        self._telegram_ids = {}  # (kind, id) -> telegram_id
+
+    @staticmethod
+    def current_version(conn):
+        row = conn.execute('SELECT version FROM principals_version WHERE id = 1').fetchone()
+        return row[0] if row else 0
+
+    def _put(self, principal):
+        self._by_telegram_id.setdefault(principal['telegram_id'], {})[principal['role']] = principal
+        self._telegram_ids[(principal['role'], principal['id'])] = principal['telegram_id']
+
+    def _remove(self, kind, principal_id):
+        telegram_id = self._telegram_ids.pop((kind, principal_id), None)
+        entries = self._by_telegram_id.get(telegram_id)
+        if entries is not None:
+            entries.pop(kind, None)
+            if not entries:
+                del self._by_telegram_id[telegram_id]
+
+    def _load(self, conn, version):
+        rows = conn.execute('SELECT * FROM principals').fetchall()
+        with self._lock:
+            self._by_telegram_id = {}
+            self._telegram_ids = {}
+            for row in rows:
+                self._put(principal_to_dict(row))
+            self._version = version
+
+    def get(self, conn, telegram_id):
+        """Пользователь или владелец по telegram_id; None, если не найден"""
+        try:
+            telegram_id = int(telegram_id)
+        except (TypeError, ValueError):
+            return None
+        version = self.current_version(conn)
+        with self._lock:
+            loaded = self._version == version
+        if not loaded:
+            self._load(conn, version)
+
+        with self._lock:
+            entries = self._by_telegram_id.get(telegram_id)
+            if not entries:
+                return None
+            for kind in KIND_PRIORITY:
+                if kind in entries:
+                    return entries[kind]
+        return None
+
+    def sync(self, conn, kind, principal_id):
+        """Обновить таблицу после записи в users/owners.
+
+        Вызывается в той же транзакции, что и запись (до commit): если до
+        записи таблица была актуальна, изменение применяется точечно.
+        """
+        version = self.current_version(conn)
+        with self._lock:
+            if self._version is None or self._version == version:
+                return
+            if self._version != version - 1:
+                # Пропустили чужие изменения - перечитаем при следующем обращении
+                self._version = None
+                return
+
+        row = conn.execute(
+            'SELECT * FROM principals WHERE kind = ? AND principal_id = ?', (kind, principal_id)
+        ).fetchone()
+        with self._lock:
+            self._remove(kind, principal_id)
+            if row is not None:
+                self._put(principal_to_dict(row))
+            self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+
+# Таблица учетных записей процесса
+principal_directory = PrincipalDirectory()
@@ -1,11 +1,21 @@
 import os
 import json
 import logging
-from datetime import datetime
-from flask import render_template, request, jsonify, send_from_directory
+import math
+from datetime import date, datetime, timedelta
+from flask import g, render_template, request, jsonify, send_from_directory
 from flask_cors import CORS
-from app import app
-import random
+from app import app, db_pool, get_pooled_connection
+from app.db_tuning import read_active_pragmas, storage_settings
+from app.database import Apartment, Booking, BookingConflictError, Payment, User
+from app.availability_calendar import availability_calendar
+from app.booking_index import to_night
+from app.apartment_catalog import apartment_catalog, apartment_to_dict
+from app.pricing import pricing_engine, PricingError
+from app.idempotency import idempotent
+from app.sheets_integration import sheets_sync_enabled
+from app.telegram_webapp import InitDataError, issue_session, validate_init_data, webapp_user
+from app import outbox
 
 # Включаем CORS
 CORS(app)
@@ -14,22 +24,6 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Тестовые данные
-APARTMENTS = [
-    {
-        "id": 1,
-        "title": "Уютная квартира в центре",
-        "address": "ул. Ленина, 10",
-        "price_per_day": 2500,
-        "image_url": "https://images.unsplash.com/photo-1522708323590-d24dbb6b0267?ixlib=rb-4.0.3",  # Используем реальное изображение
-        "description": "Светлая квартира с современным ремонтом",
-        "has_wifi": True,
-        "has_kitchen": True,
-        "has_parking": False,
-        "has_smart_lock": True
-    }
-]
-
 @app.route('/')
 def index():
     """Главная страница"""
@@ -54,45 +48,93 @@ def calculate_price():
         data = request.json
         logger.info(f"Received price calculation request: {data}")
         
-        apartment_id = data.get('apartment_id')
-        check_in_date = datetime.strptime(data.get('check_in_date'), '%Y-%m-%d')
-        check_out_date = datetime.strptime(data.get('check_out_date'), '%Y-%m-%d')
-        
-        # Находим нужную квартиру из тестовых данных
-        apartments = {
-            '1': {'price_per_day': 2500},
-            '2': {'price_per_day': 3500},
-            '3': {'price_per_day': 5000}
-        }
-        
-        apartment = apartments.get(apartment_id)
-        
-        if not apartment:
+        # Стоимость считает движок цен - тот же расчет используется при создании бронирования
+        try:
+            with get_pooled_connection() as conn:
+                quote = pricing_engine.quote(
+                    conn, data.get('apartment_id'), data.get('check_in_date'), data.get('check_out_date')
+                )
+        except PricingError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if quote is None:
             return jsonify({'error': 'Apartment not found'}), 404
         
-        # Рассчитываем количество дней
-        num_days = (check_out_date - check_in_date).days
-        
-        if num_days <= 0:
-            return jsonify({'error': 'Check-out date must be after check-in date'}), 400
+        return jsonify(quote)
+    except Exception as e:
+        logger.error(f"Error calculating price: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Максимальное число котировок в одном пакетном запросе
+MAX_PRICE_BATCH_ITEMS = int(os.getenv('MAX_PRICE_BATCH_ITEMS', 500))
+
+@app.route('/api/calculate-price/batch', methods=['POST'])
+def calculate_price_batch():
+    """API для расчета стоимости списка (квартира, заезд, выезд) за один запрос"""
+    try:
+        data = request.json or {}
+        items = data.get('items')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(items) > MAX_PRICE_BATCH_ITEMS:
+            return jsonify({'error': f'Too many items, maximum is {MAX_PRICE_BATCH_ITEMS}'}), 400
+        if not all(isinstance(item, dict) for item in items):
+            return jsonify({'error': 'Each item must be an object'}), 400
+
+        logger.info(f"Received batch price calculation request: {len(items)} items")
+
+        with get_pooled_connection() as conn:
+            results = pricing_engine.quote_many(conn, [
+                (item.get('apartment_id'), item.get('check_in_date'), item.get('check_out_date'))
+                for item in items
+            ])
+
+        # Ошибка одного элемента не отменяет остальные котировки
+        quotes = []
+        for result in results:
+            if isinstance(result, PricingError):
+                quotes.append({'error': str(result)})
+            elif result is None:
+                quotes.append({'error': 'Apartment not found'})
+            else:
+                quotes.append(result)
+
+        return jsonify({'count': len(quotes), 'quotes': quotes})
+    except Exception as e:
+        logger.error(f"Error calculating batch price: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/webapp/session', methods=['POST'])
+def create_webapp_session():
+    """API для обмена initData Telegram Mini App на короткоживущий токен сессии"""
+    try:
+        data = request.get_json(silent=True) or {}
+        init_data = data.get('init_data') or request.headers.get('X-Telegram-Init-Data')
         
-        # Рассчитываем стоимость
-        price_per_day = apartment['price_per_day']
-        total_price = price_per_day * num_days
+        try:
+            user = validate_init_data(init_data)['user']
+        except InitDataError as e:
+            logger.warning(f"Отклонена initData Mini App: {str(e)}")
+            return jsonify({'error': str(e)}), 401
         
+        token, session = issue_session(user, app.config['SECRET_KEY'])
         return jsonify({
-            'apartment_id': apartment_id,
-            'check_in_date': check_in_date.strftime('%Y-%m-%d'),
-            'check_out_date': check_out_date.strftime('%Y-%m-%d'),
-            'num_days': num_days,
-            'price_per_day': price_per_day,
-            'total_price': total_price
+            'session_token': token,
+            'expires_at': session['exp'],
+            'user': {
+                'telegram_id': session['telegram_id'],
+                'username': session['username'],
+                'first_name': session['first_name']
+            }
         })
     except Exception as e:
-        logger.error(f"Error calculating price: {str(e)}")
+        logger.error(f"Error creating webapp session: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/submit-quote', methods=['POST'])
+@webapp_user()
+@idempotent('submit_quote')
 def submit_quote():
     try:
         # Получаем данные из запроса
@@ -123,9 +165,6 @@ def submit_quote():
         app.logger.info(f"Даты бронирования: {dates}")
         app.logger.info(f"Общая стоимость: {total_price}")
         
-        # Генерируем уникальный ID бронирования
-        booking_id = random.randint(10000, 99999)
-        
         # Преобразуем ID апартаментов в название
         apartment_names = {
             1: "Квартира на Ленина",
@@ -137,7 +176,6 @@ def submit_quote():
         
         # Формируем данные для записи
         booking_data = {
-            'booking_id': booking_id,
             'name': f"{user_info.get('name', 'Гость')} {user_info.get('phone', '')}",
             'apartment_id': apartment_id,
             'apartment_name': apartment_name,
@@ -150,33 +188,47 @@ def submit_quote():
         app.logger.info(f"Подготовлены данные для записи в базу: {booking_data}")
         
         try:
-            # Импортируем функцию для работы с Airtable
-            from app.airtable_integration import add_booking_to_airtable
-            
-            # Добавляем данные в Airtable
-            result = add_booking_to_airtable(booking_data)
-            
-            if result:
-                app.logger.info(f"Бронирование №{booking_id} успешно создано и сохранено в Airtable")
-                return jsonify({
-                    "success": True,
-                    "booking_id": booking_id,
-                    "message": "Бронирование успешно создано"
-                })
-            else:
-                app.logger.error("Ошибка при записи данных в Airtable")
-                return jsonify({
-                    "success": False,
-                    "error": "Ошибка при создании бронирования (проблема с сохранением данных)"
-                }), 500
+            # Сохраняем бронирование; запись в Airtable выполняется в фоне через outbox
+            # Telegram ID берется только из проверенной сессии Mini App; без нее - анонимный гость
+            telegram_id = g.webapp_user['telegram_id'] if g.webapp_user else None
+            total_price = booking_data['total_price'] = resolve_booking_price(
+                apartment_id, dates.get('check_in_date'), dates.get('check_out_date'), total_price
+            )
+            if total_price is None:
+                return jsonify({"success": False, "error": "Apartment not found"}), 404
+            # Гость создается в транзакции бронирования, только если даты свободны
+            booking_id = Booking.create(
+                user_id=None,
+                guest={'username': user_info.get('name', 'Гость'), 'telegram_id': telegram_id},
+                apartment_id=apartment_id,
+                check_in_date=dates.get('check_in_date'),
+                check_out_date=dates.get('check_out_date'),
+                total_price=total_price,
+                outbox_events=[('airtable', booking_data)] + sheets_booking_events(
+                    apartment_id, user_info.get('name', 'Гость'),
+                    dates.get('check_in_date'), dates.get('check_out_date'), total_price, 'pending'
+                )
+            )
+        except PricingError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except BookingConflictError as e:
+            app.logger.info(f"Даты заняты: {str(e)}, пересечения: {e.conflicting_ids}")
+            return jsonify({"success": False, "error": "Apartment is not available for selected dates"}), 409
         except Exception as e:
-            app.logger.error(f"Исключение при работе с Airtable: {str(e)}")
+            app.logger.error(f"Исключение при сохранении бронирования: {str(e)}")
             import traceback
             app.logger.error(traceback.format_exc())
             return jsonify({
                 "success": False,
                 "error": "Ошибка при создании бронирования (проблема с сохранением данных)"
             }), 500
+        
+        app.logger.info(f"Бронирование №{booking_id} успешно создано")
+        return jsonify({
+            "success": True,
+            "booking_id": booking_id,
+            "message": "Бронирование успешно создано"
+        })
             
     except Exception as e:
         app.logger.error(f"Ошибка при создании бронирования: {str(e)}")
@@ -184,25 +236,233 @@ def submit_quote():
         app.logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+def resolve_booking_price(apartment_id, check_in_date, check_out_date, client_total):
+    """Стоимость бронирования по движку цен; None, если квартиры нет в БД.
+
+    Сумма клиента только сверяется с расчетной. Даты в прошлом или сумма
+    не числом - PricingError.
+    """
+    if client_total is not None:
+        try:
+            client_total = float(client_total)
+        except (TypeError, ValueError):
+            raise PricingError('total_price must be a number')
+    with get_pooled_connection() as conn:
+        quote = pricing_engine.quote(conn, apartment_id, check_in_date, check_out_date)
+    if quote is None:
+        return None
+    if to_night(check_in_date) < date.today().toordinal():
+        raise PricingError('Check-in date cannot be in the past')
+    if client_total is not None and abs(client_total - quote['total_price']) > 0.01:
+        logger.warning(
+            f"Стоимость клиента {client_total} не совпадает с расчетной {quote['total_price']} "
+            f"для квартиры {apartment_id}, используем расчетную"
+        )
+    return quote['total_price']
+
+def sheets_booking_events(apartment_id, user_name, check_in_date, check_out_date, total_price, status):
+    """Событие outbox для строки бронирования в Google Sheets; пусто, если таблица не настроена"""
+    if not sheets_sync_enabled():
+        return []
+    apartment = Apartment.get_by_id(apartment_id)
+    return [('google_sheets', {
+        'user_name': user_name,
+        'apartment_title': apartment['title'] if apartment else f"Квартира #{apartment_id}",
+        'check_in_date': check_in_date,
+        'check_out_date': check_out_date,
+        'total_price': total_price,
+        'status': status
+    })]
+
 @app.route('/default-apartment.jpg')
 def default_apartment():
     return app.send_static_file('images/default-apartment.jpg')
 
+# Размер страницы списка квартир
+DEFAULT_APARTMENTS_PAGE_SIZE = 10
+MAX_APARTMENTS_PAGE_SIZE = 50
+
 @app.route('/api/apartments', methods=['GET'])
 def get_apartments():
-    """API для получения списка доступных квартир"""
+    """API для получения списка доступных квартир.
+    
+    Без параметров возвращает весь список; с limit и/или cursor (ID последней
+    квартиры предыдущей страницы) - страницу {apartments, next_cursor, limit}.
+    Ответы кэшируются по версии каталога и снабжаются строгим ETag: при
+    совпадении с If-None-Match отдается 304 без тела.
+    """
     try:
         logger.info("Получен запрос на список квартир")
-        return jsonify(APARTMENTS)
+        
+        cursor = limit = None
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit = int(request.args.get('limit', DEFAULT_APARTMENTS_PAGE_SIZE))
+                cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+            except ValueError:
+                return jsonify({'error': 'limit and cursor must be integers'}), 400
+            if limit <= 0:
+                return jsonify({'error': 'limit must be positive'}), 400
+            limit = min(limit, MAX_APARTMENTS_PAGE_SIZE)
+        
+        with get_pooled_connection() as conn:
+            cached = apartment_catalog.get(
+                conn, lambda data: app.json.dumps(data).encode('utf-8'), cursor, limit
+            )
+        
+        response = app.response_class(cached.body, mimetype='application/json')
+        response.set_etag(cached.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error getting apartments: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/availability/search', methods=['POST'])
+def search_availability():
+    """API для поиска всех свободных квартир на даты с фильтрами за один запрос"""
+    try:
+        data = request.json or {}
+        logger.info(f"Получен запрос на поиск свободных квартир: {data}")
+        
+        if not data.get('check_in_date') or not data.get('check_out_date'):
+            return jsonify({'error': 'check_in_date and check_out_date are required'}), 400
+        
+        if not isinstance(data['check_in_date'], str) or not isinstance(data['check_out_date'], str):
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        try:
+            check_in_date = datetime.strptime(data['check_in_date'][:10], '%Y-%m-%d')
+            check_out_date = datetime.strptime(data['check_out_date'][:10], '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        num_days = (check_out_date - check_in_date).days
+        if num_days <= 0:
+            return jsonify({'error': 'Check-out date must be after check-in date'}), 400
+        
+        try:
+            min_price, max_price = (
+                None if data.get(name) is None else float(data[name])
+                for name in ('min_price', 'max_price')
+            )
+        except (TypeError, ValueError):
+            return jsonify({'error': 'min_price and max_price must be numbers'}), 400
+        if any(price is not None and not math.isfinite(price) for price in (min_price, max_price)):
+            return jsonify({'error': 'min_price and max_price must be numbers'}), 400
+        
+        apartments = Apartment.search_available(
+            check_in_date.strftime('%Y-%m-%d'),
+            check_out_date.strftime('%Y-%m-%d'),
+            min_price=min_price,
+            max_price=max_price,
+            has_wifi=data.get('has_wifi'),
+            has_parking=data.get('has_parking'),
+            owner_id=data.get('owner_id')
+        )
+        
+        # Стоимость - по движку цен (сезонные правила, скидки за длительность), как в котировке и бронировании
+        with get_pooled_connection() as conn:
+            quotes = pricing_engine.quote_many(conn, [
+                (row['id'], check_in_date.date(), check_out_date.date()) for row in apartments
+            ])
+        
+        results = []
+        for row, quote in zip(apartments, quotes):
+            # Квартира удалена между поиском и расчетом цены
+            if not isinstance(quote, dict):
+                continue
+            apartment = apartment_to_dict(row)
+            apartment['total_price'] = quote['total_price']
+            results.append(apartment)
+        
+        return jsonify({
+            'check_in_date': check_in_date.strftime('%Y-%m-%d'),
+            'check_out_date': check_out_date.strftime('%Y-%m-%d'),
+            'num_days': num_days,
+            'count': len(results),
+            'apartments': results
+        })
+    except Exception as e:
+        logger.error(f"Error searching availability: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Максимальная длина запрашиваемого календаря, дней
+MAX_CALENDAR_DAYS = 731
+
+@app.route('/api/apartments/<int:apartment_id>/calendar', methods=['GET'])
+def get_apartment_calendar(apartment_id):
+    """API для получения занятости квартиры по дням (для выбора дат)"""
+    try:
+        if not Apartment.get_by_id(apartment_id):
+            return jsonify({'error': 'Apartment not found'}), 404
+        
+        try:
+            date_from = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else datetime.now()
+            date_to = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else date_from + timedelta(days=365)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        num_days = (date_to.date() - date_from.date()).days
+        if num_days <= 0:
+            return jsonify({'error': "'to' must be after 'from'"}), 400
+        if num_days > MAX_CALENDAR_DAYS:
+            return jsonify({'error': f'Calendar range is limited to {MAX_CALENDAR_DAYS} days'}), 400
+        
+        occupancy = Booking.get_occupancy(apartment_id, date_from, date_to)
+        
+        return jsonify({
+            'apartment_id': apartment_id,
+            'from': date_from.strftime('%Y-%m-%d'),
+            'to': date_to.strftime('%Y-%m-%d'),
+            'days': [{'date': day.isoformat(), 'occupied': occupied} for day, occupied in occupancy]
+        })
+    except Exception as e:
+        logger.error(f"Error getting apartment calendar: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/favicon.ico')
 def favicon():
     return app.send_static_file('images/favicon.ico')
 
+@app.route('/api/bookings/check-availability', methods=['POST'])
+def check_availability():
+    """Проверка доступности квартиры на указанные даты с расчетом стоимости"""
+    try:
+        data = request.json or {}
+        
+        # Движок цен проверяет даты и существование квартиры
+        try:
+            with get_pooled_connection() as conn:
+                quote = pricing_engine.quote(
+                    conn, data.get('apartment_id'), data.get('check_in_date'), data.get('check_out_date')
+                )
+        except PricingError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        if quote is None:
+            return jsonify({'status': 'error', 'message': 'Apartment not found'}), 404
+        
+        # Пересечения ищутся по индексу интервалов квартиры, без выборки бронирований
+        if Booking.has_conflict(quote['apartment_id'], quote['check_in_date'], quote['check_out_date']):
+            return jsonify({
+                'status': 'error',
+                'available': False,
+                'message': 'Apartment is not available for selected dates'
+            }), 400
+        
+        return jsonify({
+            'status': 'success',
+            'available': True,
+            'total_price': quote['total_price'],
+            'days': quote['num_days']
+        })
+    except Exception as e:
+        logger.error(f"Error checking availability: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/bookings/create', methods=['POST'])
+@webapp_user()
+@idempotent('bookings_create')
 def create_booking():
     """API для создания нового бронирования"""
     try:
@@ -231,9 +491,6 @@ def create_booking():
             logger.error(error_msg)
             return jsonify({'success': False, 'error': error_msg}), 400
         
-        # Генерируем ID бронирования
-        booking_id = 12345  # В реальной БД будет автоинкремент
-        
         # Поиск названия апартаментов по ID
         apartment_names = {
             '1': 'Уютная студия в центре',
@@ -249,7 +506,6 @@ def create_booking():
         
         # Собираем полный набор данных для записи
         booking_data = {
-            'booking_id': booking_id,
             'name': user_name,
             'phone': user_phone,
             'email': data.get('email', ''),
@@ -264,14 +520,35 @@ def create_booking():
         # Логируем данные перед отправкой
         logger.info(f"Подготовлены данные для записи в базу: {booking_data}")
         
-        # Импортируем функцию для работы с Airtable
-        from app.airtable_integration import add_booking_to_airtable
-        
-        # Отправляем данные в Airtable
-        airtable_result = add_booking_to_airtable(booking_data)
-        
-        if not airtable_result:
-            logger.warning("Данные не были сохранены в Airtable, но бронирование создано")
+        # Сохраняем бронирование; данные в Airtable отправляются в фоне через outbox
+        try:
+            booking_data['total_price'] = resolve_booking_price(
+                data['apartment_id'], data['check_in_date'], data['check_out_date'], data['total_price']
+            )
+        except PricingError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if booking_data['total_price'] is None:
+            return jsonify({'success': False, 'error': 'Apartment not found'}), 404
+        
+        # Telegram ID берется только из проверенной сессии Mini App; без нее - анонимный гость
+        telegram_id = g.webapp_user['telegram_id'] if g.webapp_user else None
+        try:
+            # Гость создается в транзакции бронирования, только если даты свободны
+            booking_id = Booking.create(
+                user_id=None,
+                guest={'username': user_name, 'telegram_id': telegram_id},
+                apartment_id=data['apartment_id'],
+                check_in_date=data['check_in_date'],
+                check_out_date=data['check_out_date'],
+                total_price=booking_data['total_price'],
+                outbox_events=[('airtable', booking_data)] + sheets_booking_events(
+                    data['apartment_id'], user_name,
+                    data['check_in_date'], data['check_out_date'], booking_data['total_price'], 'pending'
+                )
+            )
+        except BookingConflictError as e:
+            logger.info(f"Даты заняты: {str(e)}, пересечения: {e.conflicting_ids}")
+            return jsonify({'success': False, 'error': 'Apartment is not available for selected dates'}), 409
         
         return jsonify({
             'success': True,
@@ -283,6 +560,42 @@ def create_booking():
         logger.error(traceback.format_exc())
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Статус платежа, после которого подтвержденное бронирование не отменяется
+PAYMENT_STATUS_PAID = 'paid'
+
+@app.route('/api/bookings/<int:booking_id>/cancel', methods=['POST'])
+@webapp_user(required=True)
+def cancel_booking(booking_id):
+    """API для отмены бронирования гостем; Google Sheet обновляется в фоне через outbox"""
+    try:
+        booking = Booking.get_by_id(booking_id)
+        if not booking:
+            return jsonify({'status': 'error', 'message': 'Booking not found'}), 404
+        
+        # Отменить можно только свое бронирование (пользователь из сессии Mini App)
+        user = User.get_by_id(booking['user_id'])
+        if not user or user['telegram_id'] != g.webapp_user['telegram_id']:
+            return jsonify({'status': 'error', 'message': 'Insufficient permissions'}), 403
+        
+        if booking['status'] == 'cancelled':
+            return jsonify({'status': 'success', 'message': 'Booking is already cancelled'})
+        
+        if booking['status'] == 'confirmed' and any(
+            payment['status'] == PAYMENT_STATUS_PAID for payment in Payment.get_by_booking_id(booking_id)
+        ):
+            return jsonify({'status': 'error', 'message': 'Cannot cancel paid booking'}), 400
+        
+        # Смена статуса освобождает даты в индексах; строка для таблицы ставится в outbox той же транзакцией
+        Booking.update_status(booking_id, 'cancelled', outbox_events=sheets_booking_events(
+            booking['apartment_id'], user['full_name'] or user['username'],
+            booking['check_in_date'], booking['check_out_date'], booking['total_price'], 'cancelled'
+        ))
+        
+        return jsonify({'status': 'success', 'message': 'Booking cancelled successfully'})
+    except Exception as e:
+        logger.error(f"Error cancelling booking: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/test-env')
 def test_env():
     """Тестовый маршрут для проверки переменных окружения"""
@@ -296,4 +609,55 @@ def test_env():
         return jsonify(env_data)
     except Exception as e:
         app.logger.error(f"Ошибка при проверке переменных окружения: {e}")
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/healthz')
+def healthz():
+    """Легкая проверка работоспособности для мониторинга (без рендеринга страниц)"""
+    try:
+        with get_pooled_connection() as conn:
+            conn.execute('SELECT 1').fetchone()
+        return jsonify({'status': 'ok'})
+    except Exception as e:
+        logger.error(f"Проверка работоспособности не пройдена: {str(e)}")
+        return jsonify({'status': 'error', 'error': str(e)}), 503
+
+@app.route('/api/diagnostics/storage')
+def storage_diagnostics():
+    """Активные настройки хранилища SQLite и состояние пула соединений"""
+    try:
+        with get_pooled_connection() as conn:
+            active = read_active_pragmas(conn)
+        return jsonify({
+            'active': active,
+            'configured': storage_settings,
+            'pool': db_pool.stats()
+        })
+    except Exception as e:
+        logger.error(f"Ошибка при получении настроек хранилища: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/diagnostics/calendar')
+def calendar_diagnostics():
+    """Сверка битовых карт занятости с таблицей бронирований"""
+    try:
+        with get_pooled_connection() as conn:
+            mismatched = availability_calendar.verify(conn)
+        return jsonify({
+            'consistent': not mismatched,
+            'mismatched_apartments': mismatched
+        })
+    except Exception as e:
+        logger.error(f"Ошибка при сверке календарей: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/diagnostics/outbox')
+def outbox_diagnostics():
+    """Состояние очереди фоновой синхронизации с внешними системами"""
+    try:
+        with get_pooled_connection() as conn:
+            counts = outbox.stats(conn)
+        return jsonify({'messages': counts})
+    except Exception as e:
+        logger.error(f"Ошибка при получении состояния outbox: {str(e)}")
+        return jsonify({'error': str(e)}), 500
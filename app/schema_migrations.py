@@ -0,0 +1,338 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Миграции схемы SQLite. Номер применённой миграции хранится в PRAGMA user_version,
+# поэтому каждая миграция выполняется ровно один раз для файла БД.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS = [
+    (
+        1,
+        'Индекс для проверки пересечений бронирований и версии бронирований по квартирам',
+        [
+            '''
+            CREATE INDEX IF NOT EXISTS idx_bookings_apartment_status_dates
+            ON bookings (apartment_id, status, check_in_date, check_out_date)
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS booking_versions (
+                apartment_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_version_insert
+            AFTER INSERT ON bookings
+            BEGIN
+                INSERT INTO booking_versions (apartment_id, version) VALUES (NEW.apartment_id, 1)
+                ON CONFLICT(apartment_id) DO UPDATE SET version = version + 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_version_update
+            AFTER UPDATE ON bookings
+            BEGIN
+                INSERT INTO booking_versions (apartment_id, version) VALUES (OLD.apartment_id, 1)
+                ON CONFLICT(apartment_id) DO UPDATE SET version = version + 1;
+                INSERT INTO booking_versions (apartment_id, version)
+                SELECT NEW.apartment_id, 1 WHERE NEW.apartment_id != OLD.apartment_id
+                ON CONFLICT(apartment_id) DO UPDATE SET version = version + 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_version_delete
+            AFTER DELETE ON bookings
+            BEGIN
+                INSERT INTO booking_versions (apartment_id, version) VALUES (OLD.apartment_id, 1)
+                ON CONFLICT(apartment_id) DO UPDATE SET version = version + 1;
+            END
+            ''',
+        ]
+    ),
+    (
+        2,
+        'Удобства квартир для фильтров поиска и индекс по доступности и цене',
+        [
+            'ALTER TABLE apartments ADD COLUMN has_wifi BOOLEAN DEFAULT 0',
+            'ALTER TABLE apartments ADD COLUMN has_kitchen BOOLEAN DEFAULT 0',
+            'ALTER TABLE apartments ADD COLUMN has_parking BOOLEAN DEFAULT 0',
+            'ALTER TABLE apartments ADD COLUMN has_smart_lock BOOLEAN DEFAULT 0',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_apartments_available_price
+            ON apartments (is_available, price_per_day)
+            ''',
+        ]
+    ),
+    (
+        3,
+        'Таблица outbox для фоновой синхронизации с Google Sheets и Airtable',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                target TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt
+            ON outbox (status, next_attempt_at)
+            ''',
+        ]
+    ),
+    (
+        4,
+        'Данные регистрации пользователей и статус фоновой загрузки фото документа',
+        [
+            'ALTER TABLE users ADD COLUMN full_name TEXT',
+            'ALTER TABLE users ADD COLUMN is_verified BOOLEAN DEFAULT 0',
+            'ALTER TABLE users ADD COLUMN document_photo_url TEXT',
+            'ALTER TABLE users ADD COLUMN document_status TEXT',
+        ]
+    ),
+    (
+        5,
+        'Версия каталога квартир для кэша ответов /api/apartments',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS apartment_catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            'INSERT OR IGNORE INTO apartment_catalog_version (id, version) VALUES (1, 0)',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_apartments_catalog_insert
+            AFTER INSERT ON apartments
+            BEGIN
+                UPDATE apartment_catalog_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_apartments_catalog_update
+            AFTER UPDATE ON apartments
+            BEGIN
+                UPDATE apartment_catalog_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_apartments_catalog_delete
+            AFTER DELETE ON apartments
+            BEGIN
+                UPDATE apartment_catalog_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+        ]
+    ),
+    (
+        6,
+        'Правила ценообразования (сезонные, выходные, длительность проживания) и их версия',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS pricing_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                apartment_id INTEGER,
+                rule_type TEXT NOT NULL,
+                start_date DATE,
+                end_date DATE,
+                weekdays TEXT,
+                min_nights INTEGER,
+                multiplier REAL NOT NULL DEFAULT 1.0,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (apartment_id) REFERENCES apartments (id)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS pricing_rules_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            'INSERT OR IGNORE INTO pricing_rules_version (id, version) VALUES (1, 0)',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_pricing_rules_insert
+            AFTER INSERT ON pricing_rules
+            BEGIN
+                UPDATE pricing_rules_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_pricing_rules_update
+            AFTER UPDATE ON pricing_rules
+            BEGIN
+                UPDATE pricing_rules_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_pricing_rules_delete
+            AFTER DELETE ON pricing_rules
+            BEGIN
+                UPDATE pricing_rules_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+        ]
+    ),
+    (
+        7,
+        'Ключи идемпотентности для повторов создания бронирований',
+        [
+            # WITHOUT ROWID: строки хранятся прямо в B-дереве первичного ключа (16-байтовый хеш ключа)
+            '''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key_hash BLOB PRIMARY KEY,
+                fingerprint BLOB NOT NULL,
+                status TEXT NOT NULL,
+                response_status INTEGER,
+                response_body BLOB,
+                mimetype TEXT,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at)',
+        ]
+    ),
+    (
+        8,
+        'Единый индекс пользователей и владельцев по telegram_id (principals)',
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS principals (
+                telegram_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                principal_id INTEGER NOT NULL,
+                username TEXT,
+                full_name TEXT,
+                is_verified BOOLEAN NOT NULL DEFAULT 0,
+                registered_at TIMESTAMP,
+                PRIMARY KEY (telegram_id, kind)
+            ) WITHOUT ROWID
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_principals_kind_id ON principals (kind, principal_id)',
+            '''
+            CREATE TABLE IF NOT EXISTS principals_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            'INSERT OR IGNORE INTO principals_version (id, version) VALUES (1, 0)',
+            '''
+            INSERT OR REPLACE INTO principals
+                (telegram_id, kind, principal_id, username, full_name, is_verified, registered_at)
+            SELECT telegram_id, 'user', id, username, full_name, COALESCE(is_verified, 0), created_at
+            FROM users WHERE telegram_id IS NOT NULL
+            ''',
+            '''
+            INSERT OR REPLACE INTO principals
+                (telegram_id, kind, principal_id, username, full_name, is_verified, registered_at)
+            SELECT telegram_id, 'owner', id, username, full_name, COALESCE(is_verified, 0), NULL
+            FROM owners WHERE telegram_id IS NOT NULL
+            ''',
+            # Триггеры поддерживают principals при любой записи в users/owners;
+            # версия увеличивается ровно на 1 за каждую измененную строку
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_principals_users_insert
+            AFTER INSERT ON users
+            BEGIN
+                INSERT OR REPLACE INTO principals
+                    (telegram_id, kind, principal_id, username, full_name, is_verified, registered_at)
+                SELECT NEW.telegram_id, 'user', NEW.id, NEW.username, NEW.full_name, COALESCE(NEW.is_verified, 0), NEW.created_at
+                WHERE NEW.telegram_id IS NOT NULL;
+                UPDATE principals_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_principals_users_update
+            AFTER UPDATE OF telegram_id, username, full_name, is_verified ON users
+            BEGIN
+                DELETE FROM principals WHERE kind = 'user' AND principal_id = OLD.id;
+                INSERT OR REPLACE INTO principals
+                    (telegram_id, kind, principal_id, username, full_name, is_verified, registered_at)
+                SELECT NEW.telegram_id, 'user', NEW.id, NEW.username, NEW.full_name, COALESCE(NEW.is_verified, 0), NEW.created_at
+                WHERE NEW.telegram_id IS NOT NULL;
+                UPDATE principals_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_principals_users_delete
+            AFTER DELETE ON users
+            BEGIN
+                DELETE FROM principals WHERE kind = 'user' AND principal_id = OLD.id;
+                UPDATE principals_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_principals_owners_insert
+            AFTER INSERT ON owners
+            BEGIN
+                INSERT OR REPLACE INTO principals
+                    (telegram_id, kind, principal_id, username, full_name, is_verified, registered_at)
+                SELECT NEW.telegram_id, 'owner', NEW.id, NEW.username, NEW.full_name, COALESCE(NEW.is_verified, 0), NULL
+                WHERE NEW.telegram_id IS NOT NULL;
+                UPDATE principals_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_principals_owners_update
+            AFTER UPDATE OF telegram_id, username, full_name, is_verified ON owners
+            BEGIN
+                DELETE FROM principals WHERE kind = 'owner' AND principal_id = OLD.id;
+                INSERT OR REPLACE INTO principals
+                    (telegram_id, kind, principal_id, username, full_name, is_verified, registered_at)
+                SELECT NEW.telegram_id, 'owner', NEW.id, NEW.username, NEW.full_name, COALESCE(NEW.is_verified, 0), NULL
+                WHERE NEW.telegram_id IS NOT NULL;
+                UPDATE principals_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_principals_owners_delete
+            AFTER DELETE ON owners
+            BEGIN
+                DELETE FROM principals WHERE kind = 'owner' AND principal_id = OLD.id;
+                UPDATE principals_version SET version = version + 1 WHERE id = 1;
+            END
+            ''',
+        ]
+    ),
+]
+
+
+def apply_migrations(conn):
+    """Применяет недостающие миграции схемы.
+
+    Версия перечитывается под блокировкой записи (BEGIN IMMEDIATE): если
+    процессы стартуют одновременно, миграцию применяет только первый, а
+    остальные видят уже увеличенный user_version.
+    """
+    current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version <= current_version:
+                # Миграцию уже применил другой процесс
+                conn.commit()
+                continue
+            logger.info(f"Применяем миграцию схемы {version}: {description}")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception(f"Ошибка при применении миграции схемы {version}")
+            raise
+        current_version = version
+
+    return current_version
@@ -1,10 +1,12 @@
 import os
 import logging
+import threading
+import time
 from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
 
+from app.google_clients import google_clients, SHEETS_SCOPES
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -15,60 +17,41 @@ SHEET_NAME = "Лист1"  # Имя листа в таблице
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+def sheets_sync_enabled():
+    """Настроена ли таблица для синхронизации бронирований (SPREADSHEET_ID в окружении)"""
+    return bool(os.getenv('SPREADSHEET_ID'))
+
 def get_google_sheets_client():
     """Получение клиента для работы с Google Sheets"""
     try:
-        # Путь к файлу с учетными данными сервисного аккаунта
-        credentials_file = os.getenv('GOOGLE_CREDENTIALS_FILE', 'quick-flame-437017-e6-53c51b17c354.json')
-        
-        logger.info(f"Попытка найти файл с учетными данными: {credentials_file}")
-        
-        # Проверяем наличие файла в текущей директории
-        if os.path.exists(credentials_file):
-            credentials_path = credentials_file
-        else:
-            # Ищем файл в корне проекта
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            credentials_path = os.path.join(base_path, credentials_file)
-        
-        logger.info(f"Используем путь к файлу учетных данных: {credentials_path}")
-        
-        if not os.path.exists(credentials_path):
-            logger.error(f"Файл с учетными данными не найден: {credentials_path}")
-            return None
-        
-        # Определяем области доступа
-        scope = ['https://spreadsheets.google.com/feeds',
-                 'https://www.googleapis.com/auth/spreadsheets',
-                 'https://www.googleapis.com/auth/drive']
-        
-        # Современный метод аутентификации
-        credentials = Credentials.from_service_account_file(
-            credentials_path, 
-            scopes=scope
-        )
-        
-        # Создаем клиент
-        client = gspread.authorize(credentials)
-        
-        logger.info("Успешно создан клиент Google Sheets")
-        
-        return client
+        # Клиент и учетные данные общие для процесса (см. app/google_clients.py)
+        return google_clients.get_gspread_client()
     except Exception as e:
         logger.error(f"Ошибка при подключении к Google Sheets: {str(e)}")
         return None
 
-def add_booking_to_sheet(booking_data):
-    """Добавляет данные о бронировании в Google Sheets"""
-    try:
+# Лист gspread кэшируется между вызовами, чтобы не открывать таблицу на каждое бронирование
+_booking_worksheet = None
+_booking_worksheet_lock = threading.Lock()
+
+def get_booking_worksheet():
+    """Лист для бронирований (открывается один раз на процесс)"""
+    global _booking_worksheet
+    with _booking_worksheet_lock:
+        if _booking_worksheet is not None:
+            return _booking_worksheet
+        
         # Подключаемся к Google Sheets
         client = get_google_sheets_client()
         if not client:
             logger.error("Не удалось подключиться к Google Sheets")
-            return False
+            return None
         
         logger.info(f"Открываем таблицу с ID: {SPREADSHEET_ID}")
         
+        # gspread импортируется при первом обращении к таблице, а не при старте воркера
+        from gspread.exceptions import WorksheetNotFound
+        
         try:
             # Открываем таблицу по ID
             spreadsheet = client.open_by_key(SPREADSHEET_ID)
@@ -77,12 +60,28 @@ def add_booking_to_sheet(booking_data):
             try:
                 sheet = spreadsheet.worksheet(SHEET_NAME)
                 logger.info(f"Найден лист: {SHEET_NAME}")
-            except gspread.exceptions.WorksheetNotFound:
+            except WorksheetNotFound:
                 sheet = spreadsheet.sheet1
                 logger.info("Лист по имени не найден, используем первый лист")
                 
         except Exception as e:
             logger.error(f"Ошибка при открытии таблицы: {str(e)}")
+            return None
+        
+        _booking_worksheet = sheet
+        return sheet
+
+def reset_booking_worksheet():
+    """Сбросить кэш листа (например, после ошибки записи)"""
+    global _booking_worksheet
+    with _booking_worksheet_lock:
+        _booking_worksheet = None
+
+def add_booking_to_sheet(booking_data):
+    """Добавляет данные о бронировании в Google Sheets"""
+    try:
+        sheet = get_booking_worksheet()
+        if not sheet:
             return False
         
         # Получаем текущую дату и время для записи
@@ -123,4 +122,105 @@ def add_booking_to_sheet(booking_data):
         return True
     except Exception as e:
         logger.error(f"Ошибка при добавлении данных в Google Sheets: {str(e)}")
-        return False 
\ No newline at end of file
+        reset_booking_worksheet()
+        return False
+
+# Минимальный интервал между запросами записи к Sheets API
+# (квота на запись - около 60 запросов в минуту на сервисный аккаунт)
+SHEETS_MIN_WRITE_INTERVAL = float(os.getenv('SHEETS_MIN_WRITE_INTERVAL', 1.0))
+# Максимум строк бронирований в одном запросе append
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', 200))
+
+def format_booking_row(booking_data):
+    """Строка таблицы для бронирования"""
+    check_in = datetime.fromisoformat(booking_data['check_in_date']).strftime("%d.%m.%Y %H:%M")
+    check_out = datetime.fromisoformat(booking_data['check_out_date']).strftime("%d.%m.%Y %H:%M")
+    current_time = datetime.now().strftime("%d.%m.%Y %H:%M")
+    
+    return [
+        booking_data['booking_id'],
+        booking_data['user_name'],
+        booking_data['apartment_title'],
+        check_in,
+        check_out,
+        booking_data['total_price'],
+        booking_data['status'],
+        current_time
+    ]
+
+class SheetsSyncEngine:
+    """Запись бронирований в Google Sheets пачками.
+
+    Клиент Sheets API (общий для процесса) и название первого листа кэшируются,
+    все накопленные строки записываются одним values().append, а запросы
+    разносятся не чаще SHEETS_MIN_WRITE_INTERVAL, чтобы не выйти за квоту.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sheet_titles = {}
+        self._last_write = 0.0
+    
+    def _get_service(self):
+        return google_clients.get_service('sheets', 'v4', SHEETS_SCOPES)
+    
+    def _get_sheet_title(self, service, spreadsheet_id):
+        if spreadsheet_id not in self._sheet_titles:
+            # Метаданные таблицы запрашиваем один раз
+            sheets_metadata = service.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields='sheets.properties.title'
+            ).execute()
+            self._sheet_titles[spreadsheet_id] = sheets_metadata['sheets'][0]['properties']['title']
+            logger.info(f"Название первого листа: {self._sheet_titles[spreadsheet_id]}")
+        return self._sheet_titles[spreadsheet_id]
+    
+    def _throttle(self):
+        wait = self._last_write + SHEETS_MIN_WRITE_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_write = time.monotonic()
+    
+    def append_rows(self, rows):
+        """Записать строки в первый лист таблицы одним запросом на пачку"""
+        spreadsheet_id = os.getenv('SPREADSHEET_ID')
+        if not spreadsheet_id:
+            logger.error("SPREADSHEET_ID не настроен")
+            raise ValueError("SPREADSHEET_ID not configured")
+        
+        with self._lock:
+            service = self._get_service()
+            for start in range(0, len(rows), SHEETS_BATCH_SIZE):
+                sheet_title = self._get_sheet_title(service, spreadsheet_id)
+                self._throttle()
+                try:
+                    result = service.spreadsheets().values().append(
+                        spreadsheetId=spreadsheet_id,
+                        range=f"'{sheet_title}'!A:H",
+                        valueInputOption='RAW',
+                        insertDataOption='INSERT_ROWS',
+                        body={'values': rows[start:start + SHEETS_BATCH_SIZE]}
+                    ).execute()
+                except Exception:
+                    # Лист могли переименовать - перечитаем метаданные при повторе
+                    self._sheet_titles.pop(spreadsheet_id, None)
+                    raise
+                logger.info(f"Записано строк в таблицу: {result.get('updates', {}).get('updatedRows')}")
+
+# Движок синхронизации процесса
+sheets_engine = SheetsSyncEngine()
+
+def update_google_sheets_batch(bookings):
+    """Обновление Google Sheet пачкой бронирований (один запрос на пачку)"""
+    try:
+        logger.info(f"Начинаем обновление Google Sheet, бронирований: {len(bookings)}")
+        sheets_engine.append_rows([format_booking_row(booking_data) for booking_data in bookings])
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении Google Sheet: {str(e)}")
+        logger.exception(e)
+        raise
+
+def update_google_sheet(booking_data):
+    """Обновление Google Sheet с информацией о бронировании"""
+    return update_google_sheets_batch([booking_data])
@@ -0,0 +1,62 @@
+/**
+ * Zamok - сессия Telegram Mini App
+ *
+ * initData проверяется сервером один раз (/api/webapp/session), дальше
+ * запросы отправляются с коротким токеном сессии в заголовке X-Session-Token.
+ */
+const ZamokSession = {
+    token: null,
+    expiresAt: 0,
+    pending: null,
+
+    // Получить действующий токен (null вне Telegram или при ошибке)
+    ensure() {
+        // Обновляем токен заранее, за минуту до истечения
+        if (this.token && Date.now() < (this.expiresAt - 60) * 1000) {
+            return Promise.resolve(this.token);
+        }
+
+        const webapp = window.Telegram && window.Telegram.WebApp;
+        const initData = webapp ? webapp.initData : '';
+        if (!initData) {
+            return Promise.resolve(null);
+        }
+
+        if (!this.pending) {
+            this.pending = fetch('/api/webapp/session', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ init_data: initData })
+            })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (data && data.session_token) {
+                    this.token = data.session_token;
+                    this.expiresAt = data.expires_at;
+                }
+                return this.token;
+            })
+            .catch(error => {
+                console.error('Не удалось получить сессию Mini App:', error);
+                return null;
+            })
+            .finally(() => {
+                this.pending = null;
+            });
+        }
+        return this.pending;
+    },
+
+    // fetch с заголовком сессии
+    fetch(url, options = {}) {
+        return this.ensure().then(token => {
+            const headers = Object.assign({}, options.headers);
+            if (token) {
+                headers['X-Session-Token'] = token;
+            }
+            return fetch(url, Object.assign({}, options, { headers }));
+        });
+    }
+};
@@ -0,0 +1,144 @@
+import base64
+import functools
+import hmac
+import json
+import os
+import time
+from urllib.parse import parse_qsl
+
+from flask import g, jsonify, request
+
+from app import app
+
+# Сколько секунд initData из Telegram считается свежей
+TELEGRAM_INIT_DATA_MAX_AGE = int(os.getenv('TELEGRAM_INIT_DATA_MAX_AGE', 86400))
+# Время жизни токена сессии Mini App, секунд
+WEBAPP_SESSION_TTL = int(os.getenv('WEBAPP_SESSION_TTL', 3600))
+# Требовать сессию Mini App для создания бронирований (false - анонимные гости с сайта)
+TELEGRAM_WEBAPP_AUTH_REQUIRED = os.getenv('TELEGRAM_WEBAPP_AUTH_REQUIRED', 'true').lower() == 'true'
+
+SESSION_HEADER = 'X-Session-Token'
+INIT_DATA_HEADER = 'X-Telegram-Init-Data'
+
+
+class InitDataError(ValueError):
+    """initData не прошла проверку подписи или устарела"""
+
+
+class SessionError(ValueError):
+    """Токен сессии Mini App поврежден или истек"""
+
+
+@functools.lru_cache(maxsize=8)
+def webapp_secret(bot_token):
+    """Ключ проверки initData: HMAC-SHA256 токена бота с ключом "WebAppData" (считается один раз)"""
+    return hmac.digest(b'WebAppData', bot_token.encode('utf-8'), 'sha256')
+
+
+@functools.lru_cache(maxsize=8)
+def session_secret(secret_key):
+    """Ключ подписи токенов сессии, производный от SECRET_KEY приложения"""
+    return hmac.digest(secret_key.encode('utf-8'), b'zamok-webapp-session', 'sha256')
+
+
+def validate_init_data(init_data, bot_token=None, max_age=None):
+    """Проверить подпись initData Telegram Mini App; возвращает разобранные поля (user - словарь)"""
+    bot_token = bot_token or os.getenv('TELEGRAM_BOT_TOKEN')
+    if not bot_token:
+        raise InitDataError('TELEGRAM_BOT_TOKEN is not configured')
+    if not init_data:
+        raise InitDataError('initData is missing')
+
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop('hash', '')
+    data_check_string = '\n'.join(f'{key}={fields[key]}' for key in sorted(fields))
+    expected_hash = hmac.digest(webapp_secret(bot_token), data_check_string.encode('utf-8'), 'sha256').hex()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise InitDataError('Invalid initData signature')
+
+    max_age = TELEGRAM_INIT_DATA_MAX_AGE if max_age is None else max_age
+    try:
+        auth_date = int(fields.get('auth_date', 0))
+    except ValueError:
+        raise InitDataError('Invalid auth_date')
+    if max_age and time.time() - auth_date > max_age:
+        raise InitDataError('initData is expired')
+
+    try:
+        fields['user'] = json.loads(fields['user']) if 'user' in fields else None
+    except ValueError:
+        raise InitDataError('Invalid user field')
+    if not fields['user'] or 'id' not in fields['user']:
+        raise InitDataError('initData has no user')
+    return fields
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def issue_session(user, secret_key, ttl=None):
+    """Короткоживущий подписанный токен сессии для пользователя Telegram из initData"""
+    ttl = WEBAPP_SESSION_TTL if ttl is None else ttl
+    payload = {
+        'telegram_id': int(user['id']),
+        'username': user.get('username'),
+        'first_name': user.get('first_name'),
+        'exp': int(time.time()) + ttl
+    }
+    body = _b64encode(json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+    signature = hmac.digest(session_secret(secret_key), body.encode('ascii'), 'sha256')[:16]
+    return f'{body}.{_b64encode(signature)}', payload
+
+
+def verify_session(token, secret_key):
+    """Данные сессии из токена: одна HMAC-подпись, без initData, JWT и БД"""
+    try:
+        body, signature = token.split('.')
+        expected = hmac.digest(session_secret(secret_key), body.encode('ascii'), 'sha256')[:16]
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise SessionError('Invalid session token')
+        payload = json.loads(_b64decode(body))
+    except (ValueError, UnicodeError):
+        raise SessionError('Invalid session token')
+    if not isinstance(payload, dict) or payload.get('exp', 0) < time.time():
+        raise SessionError('Session token expired')
+    return payload
+
+
+def webapp_user(required=None):
+    """Декоратор маршрута: пользователь Mini App в g.webapp_user.
+
+    Берется из токена сессии или, если его нет, из заголовка с initData.
+    Неверные данные - 401; без данных - 401 только при required
+    (по умолчанию TELEGRAM_WEBAPP_AUTH_REQUIRED).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            g.webapp_user = None
+            try:
+                token = request.headers.get(SESSION_HEADER)
+                init_data = request.headers.get(INIT_DATA_HEADER)
+                if token:
+                    g.webapp_user = verify_session(token, app.config['SECRET_KEY'])
+                elif init_data:
+                    user = validate_init_data(init_data)['user']
+                    g.webapp_user = {
+                        'telegram_id': int(user['id']),
+                        'username': user.get('username'),
+                        'first_name': user.get('first_name')
+                    }
+            except (InitDataError, SessionError) as e:
+                return jsonify({'success': False, 'error': str(e)}), 401
+
+            must_authenticate = TELEGRAM_WEBAPP_AUTH_REQUIRED if required is None else required
+            if must_authenticate and g.webapp_user is None:
+                return jsonify({'success': False, 'error': 'Telegram authorization is required'}), 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
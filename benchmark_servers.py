@@ -0,0 +1,212 @@
+"""Нагрузочное сравнение режимов запуска API (встроенный сервер Flask и профили gunicorn).
+
+Для каждого режима запускает сервер на свободном порту, дает нагрузку на
+список квартир (GET /api/apartments) и создание бронирований
+(POST /api/bookings/create) и выводит запросы в секунду и задержки.
+
+Запуск (нужны gunicorn и, для режима gevent, пакет gevent):
+    python benchmark_servers.py
+    python benchmark_servers.py --modes sync,gthread --duration 20 --concurrency 64
+
+Серверы работают с временной БД (DB_PATH) с отключенным outbox: рабочая
+instance/zamok.db не меняется, в Airtable и Google Sheets ничего не уходит.
+Ответы 409 (даты заняты) считаются успешными.
+"""
+import argparse
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_APARTMENT_TITLE = 'Квартира для нагрузочного теста серверов'
+MODES = ('dev', 'sync', 'gthread', 'gevent')
+
+
+def prepare_apartments(count):
+    """Квартиры для бронирований во временной БД; общие для всех режимов"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import get_pooled_connection, startup
+    from app.database import Apartment
+
+    startup()
+    with get_pooled_connection() as conn:
+        ids = [row[0] for row in conn.execute(
+            'SELECT id FROM apartments WHERE title = ? ORDER BY id', (BENCHMARK_APARTMENT_TITLE,)
+        )]
+    while len(ids) < count:
+        ids.append(Apartment.create(BENCHMARK_APARTMENT_TITLE, 'Тестовая улица, 2', 3000))
+    return ids[:count]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers=None):
+    env = dict(os.environ, PORT=str(port), FLASK_ENV='production')
+    if mode == 'dev':
+        command = [sys.executable, 'run.py']
+    else:
+        env.update(
+            GUNICORN_WORKER_CLASS=mode,
+            GUNICORN_BIND=f'127.0.0.1:{port}',
+            GUNICORN_ACCESS_LOG='',
+            GUNICORN_LOG_LEVEL='warning'
+        )
+        if workers:
+            env['GUNICORN_WORKERS'] = str(workers)
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Сервер {mode} завершился при запуске (код {process.returncode})')
+        try:
+            if requests.get(f'{url}/healthz', timeout=1).status_code in (200, 503):
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'Сервер {mode} не ответил за 60 секунд')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def listing_request(session, url, rng, apartment_ids):
+    return session.get(f'{url}/api/apartments', params={'limit': 20}, timeout=30)
+
+
+def booking_request(session, url, rng, apartment_ids):
+    check_in = date.today() + timedelta(days=rng.randrange(30, 3000))
+    return session.post(f'{url}/api/bookings/create', json={
+        'apartment_id': rng.choice(apartment_ids),
+        'check_in_date': check_in.isoformat(),
+        'check_out_date': (check_in + timedelta(days=rng.randint(1, 7))).isoformat(),
+        'total_price': 1,
+        'user_name': 'Нагрузочный тест'
+    }, timeout=30)
+
+
+SCENARIOS = {
+    'listing': (listing_request, (200, 304)),
+    'booking': (booking_request, (200, 409)),
+}
+
+
+def run_load(url, scenario, duration, concurrency, apartment_ids):
+    """Нагрузка в concurrency потоков в течение duration секунд; у каждого потока свой keep-alive"""
+    send, ok_statuses = SCENARIOS[scenario]
+    deadline = time.monotonic() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(number):
+        rng = random.Random(number)
+        local_latencies = []
+        local_errors = 0
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = send(session, url, rng, apartment_ids)
+                    ok = response.status_code in ok_statuses
+                except requests.RequestException:
+                    ok = False
+                local_latencies.append(time.perf_counter() - started)
+                local_errors += 0 if ok else 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors[0], elapsed)
+
+
+def summarize(latencies, errors, elapsed):
+    if not latencies:
+        return {'requests': 0, 'rps': 0, 'p50': 0, 'p95': 0, 'p99': 0, 'errors': errors}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+        'errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение режимов запуска API под нагрузкой')
+    parser.add_argument('--modes', default=','.join(MODES), help='Режимы через запятую: dev, sync, gthread, gevent')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Сценарии через запятую: listing, booking')
+    parser.add_argument('--duration', type=float, default=10, help='Длительность сценария, секунд')
+    parser.add_argument('--concurrency', type=int, default=32, help='Одновременных клиентов')
+    parser.add_argument('--workers', type=int, help='Число воркеров gunicorn (по умолчанию из gunicorn.conf.py)')
+    parser.add_argument('--apartments', type=int, default=20, help='Квартир для бронирований')
+    args = parser.parse_args()
+
+    # Временная БД и отключенный outbox: окружение наследуют и приложение
+    # в этом процессе, и запускаемые серверы
+    db_dir = tempfile.mkdtemp(prefix='zamok-benchmark-')
+    os.environ['DB_PATH'] = os.path.join(db_dir, 'zamok.db')
+    os.environ['LOG_DIR'] = db_dir
+    os.environ['OUTBOX_ENABLED'] = 'false'
+    # Бронирования создаются анонимными гостями, без сессии Mini App
+    os.environ['TELEGRAM_WEBAPP_AUTH_REQUIRED'] = 'false'
+    results = []
+    try:
+        apartment_ids = prepare_apartments(args.apartments)
+        for mode in args.modes.split(','):
+            try:
+                process, url = start_server(mode, free_port(), args.workers)
+            except RuntimeError as e:
+                print(f"Пропускаем режим {mode}: {e}")
+                continue
+            try:
+                for scenario in args.scenarios.split(','):
+                    print(f"Режим {mode}, сценарий {scenario}...")
+                    results.append((mode, scenario, run_load(url, scenario, args.duration, args.concurrency, apartment_ids)))
+            finally:
+                stop_server(process)
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+    print()
+    print(f"{'Режим':<10}{'Сценарий':<10}{'Запросов':>10}{'В секунду':>11}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'Ошибок':>8}")
+    for mode, scenario, result in results:
+        print(
+            f"{mode:<10}{scenario:<10}{result['requests']:>10}{result['rps']:>11.0f}"
+            f"{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}{result['errors']:>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import time
+from collections import OrderedDict
+
+
+class ApartmentPageCache:
+    """Кэш страниц списка квартир в боте (TTL + перепроверка по ETag).
+
+    Свежая страница отдается из памяти без запроса к API. Устаревшая
+    перепроверяется запросом с If-None-Match: при ответе 304 страница
+    продлевается без повторной загрузки.
+    """
+
+    def __init__(self, api_client, page_size=None, ttl=None, maxsize=256):
+        self.api_client = api_client
+        self.page_size = page_size if page_size is not None else int(os.getenv('BOT_APARTMENTS_PAGE_SIZE', 5))
+        self.ttl = ttl if ttl is not None else float(os.getenv('BOT_APARTMENTS_CACHE_TTL', 30))
+        self.maxsize = maxsize
+        self._pages = OrderedDict()  # cursor -> (expires_at, etag, page)
+
+    async def get_page(self, cursor=None):
+        """Страница {apartments, next_cursor, limit}; None, если API вернул ошибку"""
+        entry = self._pages.get(cursor)
+        if entry is not None and entry[0] > time.monotonic():
+            self._pages.move_to_end(cursor)
+            return entry[2]
+
+        params = {'limit': self.page_size}
+        if cursor is not None:
+            params['cursor'] = cursor
+        headers = {'If-None-Match': entry[1]} if entry is not None and entry[1] else {}
+
+        response = await self.api_client.get('/api/apartments', params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            page, etag = entry[2], entry[1]
+        elif response.status_code == 200:
+            page, etag = response.json(), response.headers.get('ETag')
+        else:
+            return None
+
+        self._pages[cursor] = (time.monotonic() + self.ttl, etag, page)
+        self._pages.move_to_end(cursor)
+        while len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+        return page
+
+    def invalidate(self):
+        self._pages.clear()
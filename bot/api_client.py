@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _settings():
+    """Настройки клиента API (читаются при создании клиента, после загрузки .env ботом)"""
+    return {
+        'timeout': float(os.getenv('BOT_API_TIMEOUT', 10)),
+        'connect_timeout': float(os.getenv('BOT_API_CONNECT_TIMEOUT', 3)),
+        'max_connections': int(os.getenv('BOT_API_MAX_CONNECTIONS', 50)),
+        'max_keepalive': int(os.getenv('BOT_API_MAX_KEEPALIVE', 20)),
+        'max_concurrency': int(os.getenv('BOT_API_MAX_CONCURRENCY', 100)),
+        'retries': int(os.getenv('BOT_API_RETRIES', 2)),
+        'backoff': float(os.getenv('BOT_API_BACKOFF', 0.3)),
+    }
+
+# Методы, которые можно безопасно повторить после ответа сервера
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRY_STATUSES = {502, 503, 504}
+
+
+class ApiClient:
+    """Асинхронный клиент API Zamok для бота.
+
+    Один httpx.AsyncClient на процесс бота держит пул keep-alive соединений,
+    семафор ограничивает число одновременных запросов к API, а ошибки
+    соединения и 502/503/504 повторяются с экспоненциальной задержкой
+    (неидемпотентные запросы - только если запрос не был отправлен).
+    """
+
+    def __init__(self, base_url, **overrides):
+        settings = dict(_settings(), **overrides)
+        self.base_url = base_url.rstrip('/')
+        self.retries = settings['retries']
+        self.backoff = settings['backoff']
+        self._max_concurrency = settings['max_concurrency']
+        self._semaphore = None
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(settings['timeout'], connect=settings['connect_timeout']),
+            limits=httpx.Limits(
+                max_connections=settings['max_connections'],
+                max_keepalive_connections=settings['max_keepalive']
+            )
+        )
+
+    def _get_semaphore(self):
+        # Семафор создается в цикле событий бота при первом запросе
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    async def request(self, method, path, retries=None, **kwargs):
+        """Запрос к API; timeout можно передать для отдельного вызова"""
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+
+        for attempt in range(retries + 1):
+            try:
+                async with self._get_semaphore():
+                    response = await self._client.request(method, path, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # Запрос не дошел до сервера - повтор безопасен для любого метода
+                if attempt >= retries:
+                    raise
+                logger.warning(f"API недоступен ({e}), повтор {attempt + 1}: {method} {path}")
+            except httpx.TransportError as e:
+                if method not in IDEMPOTENT_METHODS or attempt >= retries:
+                    raise
+                logger.warning(f"Ошибка запроса к API ({e}), повтор {attempt + 1}: {method} {path}")
+            else:
+                if response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS and attempt < retries:
+                    logger.warning(f"API вернул {response.status_code}, повтор {attempt + 1}: {method} {path}")
+                else:
+                    return response
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def aclose(self):
+        await self._client.aclose()
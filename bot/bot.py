@@ -2,8 +2,13 @@ import os
 import logging
 from telegram import Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-import requests
+from api_client import ApiClient
+from health_monitor import HealthMonitor
+from status_cache import VerificationStatusCache
+from events_server import start_events_server
+from apartment_pages import ApartmentPageCache
 import json
+import tempfile
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -42,19 +47,91 @@ if not TELEGRAM_TOKEN:
 # URL вашего веб-приложения - замените на реальный URL вашего сервера
 WEBAPP_URL = API_BASE_URL
 
+# Режим получения обновлений: polling (по умолчанию) или webhook за reverse proxy
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+BOT_WEBHOOK_LISTEN = os.getenv('BOT_WEBHOOK_LISTEN', '127.0.0.1')
+BOT_WEBHOOK_PORT = int(os.getenv('BOT_WEBHOOK_PORT', 8443))
+BOT_WEBHOOK_PATH = os.getenv('BOT_WEBHOOK_PATH', 'telegram')
+# Публичный адрес webhook, на который Telegram отправляет обновления (через reverse proxy)
+BOT_WEBHOOK_URL = os.getenv('BOT_WEBHOOK_URL')
+BOT_WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET', '')
+# Сколько обновлений обрабатывается одновременно
+BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', 64))
+# Адрес Bot API; переопределяется для локального fake_telegram_server.py
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+
+# Только типы обновлений, для которых зарегистрированы обработчики
+ALLOWED_UPDATES = [
+    update_type.strip()
+    for update_type in os.getenv('BOT_ALLOWED_UPDATES', f"{Update.MESSAGE},{Update.CALLBACK_QUERY}").split(',')
+    if update_type.strip()
+]
+
+# Приемник событий API (изменения статуса верификации); порт 0 отключает приемник
+BOT_EVENTS_HOST = os.getenv('BOT_EVENTS_HOST', '127.0.0.1')
+BOT_EVENTS_PORT = int(os.getenv('BOT_EVENTS_PORT', 8081))
+BOT_EVENTS_SECRET = os.getenv('BOT_EVENTS_SECRET', '')
+
+# Общий секрет для регистрации через API: без него API не примет Telegram ID от бота
+BOT_API_SECRET = os.getenv('BOT_API_SECRET', '')
+
+# Общий асинхронный клиент API и монитор его доступности (создаются при запуске приложения бота)
+api_client = None
+health_monitor = None
+events_server = None
+apartment_pages = None
+
+# Статусы верификации пользователей; сбрасываются событиями от API
+status_cache = VerificationStatusCache()
+
+# Ответ пользователю, когда монитор видит, что API недоступен
+API_UNAVAILABLE_MESSAGE = "Сервис временно недоступен. Пожалуйста, попробуйте через несколько минут. 🔧"
+
+async def init_api_client(application: Application):
+    """Создание клиента API с пулом соединений и запуск фоновой проверки API"""
+    global api_client, health_monitor, events_server, apartment_pages
+    api_client = ApiClient(API_BASE_URL)
+    apartment_pages = ApartmentPageCache(api_client)
+    health_monitor = HealthMonitor(api_client)
+    health_monitor.start()
+    
+    if BOT_EVENTS_PORT and not BOT_EVENTS_SECRET:
+        logger.warning("BOT_EVENTS_SECRET не задан, приемник событий API не запущен")
+    elif BOT_EVENTS_PORT:
+        events_server = start_events_server(status_cache, BOT_EVENTS_HOST, BOT_EVENTS_PORT, BOT_EVENTS_SECRET)
+
+async def close_api_client(application: Application):
+    """Остановка проверки API и закрытие соединений клиента"""
+    if events_server is not None:
+        events_server.shutdown()
+    if health_monitor is not None:
+        await health_monitor.stop()
+    if api_client is not None:
+        await api_client.aclose()
+
+def api_available():
+    """Доступность API по последней фоновой проверке (без сетевого запроса)"""
+    return health_monitor is None or health_monitor.available
+
+async def get_auth_status(telegram_id):
+    """Статус регистрации пользователя: из кэша или из API (None - не зарегистрирован)"""
+    status = status_cache.get(telegram_id)
+    if status is not None:
+        return status
+    
+    response = await api_client.get(f'/api/auth/status/{telegram_id}')
+    if response.status_code != 200:
+        return None
+    status = response.json()
+    status_cache.set(telegram_id, status)
+    return status
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     try:
         logger.info(f"Пользователь {update.effective_user.id} запустил бота")
         logger.info("Создаю клавиатуру...")
         
-        # Проверяем доступность API
-        try:
-            response = requests.get(API_BASE_URL)
-            logger.info(f"Статус API: {response.status_code}")
-        except Exception as api_error:
-            logger.error(f"Ошибка при проверке API: {str(api_error)}")
-        
         keyboard = [
             [InlineKeyboardButton("Просмотр квартир", callback_data='view_apartments')],
             [InlineKeyboardButton("📝 Регистрация", callback_data='register')],
@@ -76,6 +153,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         logger.info("Сообщение отправлено успешно")
         
+        # Состояние API берем из фоновой проверки, без запроса на каждый /start
+        if not api_available():
+            logger.warning(f"API недоступен: {health_monitor.last_error}")
+            await update.message.reply_text(API_UNAVAILABLE_MESSAGE)
+        
     except Exception as e:
         logger.error(f"Ошибка в обработчике start: {str(e)}")
         logger.error(f"Тип ошибки: {type(e)}")
@@ -85,26 +167,62 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"Детали ошибки: {str(e)}"
         )
 
+def format_apartments_page(apartments, page_number):
+    """Текст одной страницы списка квартир"""
+    message = f"Доступные квартиры (стр. {page_number + 1}):\n\n"
+    for apt in apartments:
+        message += f"🏠 {apt.get('title', 'Без названия')}\n"
+        message += f"📍 {apt.get('address', 'Адрес не указан')}\n"
+        message += f"💰 {apt.get('price_per_day', 'Цена не указана')} руб/сутки\n"
+        message += f"📝 {apt.get('description', 'Описание отсутствует')}\n\n"
+    return message
+
 async def view_apartments_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик просмотра квартир"""
+    """Обработчик просмотра квартир (постранично, с кнопками навигации)"""
     query = update.callback_query
     await query.answer()
     
+    if not api_available():
+        await query.message.reply_text(API_UNAVAILABLE_MESSAGE)
+        return
+    
+    # Курсоры открытых страниц: cursors[n] - курсор для страницы n
+    if query.data == 'view_apartments':
+        page_number = 0
+        context.user_data['apartment_cursors'] = [None]
+    else:
+        page_number = int(query.data.split(':')[1])
+    cursors = context.user_data.get('apartment_cursors') or [None]
+    if page_number >= len(cursors):
+        # Курсор страницы неизвестен (например, после перезапуска бота) - начинаем сначала
+        page_number, cursors = 0, [None]
+    
     try:
-        response = requests.get(f"{API_BASE_URL}/api/apartments")
-        if response.status_code == 200:
-            apartments = response.json()
-            message = "Доступные квартиры:\n\n"
-            
-            for apt in apartments:
-                message += f"🏠 {apt.get('title', 'Без названия')}\n"
-                message += f"📍 {apt.get('address', 'Адрес не указан')}\n"
-                message += f"💰 {apt.get('price', 'Цена не указана')} руб/мес\n"
-                message += f"📝 {apt.get('description', 'Описание отсутствует')}\n\n"
-            
-            await query.message.reply_text(message)
-        else:
+        page = await apartment_pages.get_page(cursors[page_number])
+        if page is None:
             await query.message.reply_text("Не удалось получить список квартир. Попробуйте позже.")
+            return
+        
+        if not page['apartments']:
+            await query.message.reply_text("Сейчас нет доступных квартир.")
+            return
+        
+        del cursors[page_number + 1:]
+        buttons = []
+        if page_number > 0:
+            buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"apartments_page:{page_number - 1}"))
+        if page['next_cursor'] is not None:
+            cursors.append(page['next_cursor'])
+            buttons.append(InlineKeyboardButton("Далее ➡️", callback_data=f"apartments_page:{page_number + 1}"))
+        context.user_data['apartment_cursors'] = cursors
+        
+        message = format_apartments_page(page['apartments'], page_number)
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+        if query.data == 'view_apartments':
+            await query.message.reply_text(message, reply_markup=reply_markup)
+        else:
+            # Листаем в том же сообщении
+            await query.edit_message_text(message, reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Ошибка при получении списка квартир: {str(e)}")
         await query.message.reply_text("Произошла ошибка при получении списка квартир.")
@@ -114,9 +232,13 @@ async def register_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
+    if not api_available():
+        await query.message.reply_text(API_UNAVAILABLE_MESSAGE)
+        return
+    
     # Проверяем статус регистрации
-    response = requests.get(f"{API_BASE_URL}/api/auth/status/{query.from_user.id}")
-    if response.status_code == 200 and response.json()['is_verified']:
+    status = await get_auth_status(query.from_user.id)
+    if status and status['is_verified']:
         await query.message.reply_text("Вы уже зарегистрированы и верифицированы в системе! ✅")
         return
     
@@ -132,23 +254,33 @@ async def handle_document_photo(update: Update, context: ContextTypes.DEFAULT_TY
     if not context.user_data.get('awaiting_document'):
         return
     
+    if not api_available():
+        # Флаг ожидания документа не сбрасываем: пользователь сможет отправить фото позже
+        await update.message.reply_text(API_UNAVAILABLE_MESSAGE)
+        return
+    
     photo = update.message.photo[-1]
     file = await context.bot.get_file(photo.file_id)
     
-    # Загружаем фото
-    photo_data = await file.download_as_bytearray()
-    
-    # Отправляем данные на сервер
-    files = {'document_photo': ('document.jpg', photo_data, 'image/jpeg')}
     data = {
         'telegram_id': update.effective_user.id,
         'username': update.effective_user.username,
         'full_name': f"{update.effective_user.first_name} {update.effective_user.last_name or ''}"
     }
     
-    response = requests.post(f"{API_BASE_URL}/api/auth/register", files=files, data=data)
+    # Скачиваем фото во временный файл и отправляем на сервер из файла, без копии в памяти бота
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        photo_path = await file.download_to_drive(Path(tmp_dir) / 'document.jpg')
+        with open(photo_path, 'rb') as photo_file:
+            files = {'document_photo': ('document.jpg', photo_file, 'image/jpeg')}
+            response = await api_client.post(
+                '/api/auth/register', files=files, data=data, timeout=60,
+                headers={'X-Bot-Api-Secret': BOT_API_SECRET}
+            )
     
-    if response.status_code == 200:
+    # 202: сервер принял документ и загружает его в хранилище в фоне
+    if response.status_code in (200, 202):
+        status_cache.invalidate(update.effective_user.id)
         await update.message.reply_text(
             "Документ успешно загружен! ✅\n"
             "Ваша заявка на регистрацию принята и будет рассмотрена администратором.\n"
@@ -167,9 +299,13 @@ async def my_bookings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
     
+    if not api_available():
+        await query.message.reply_text(API_UNAVAILABLE_MESSAGE)
+        return
+    
     # Проверяем статус регистрации
-    response = requests.get(f"{API_BASE_URL}/api/auth/status/{query.from_user.id}")
-    if response.status_code != 200 or not response.json()['is_verified']:
+    status = await get_auth_status(query.from_user.id)
+    if not status or not status['is_verified']:
         await query.message.reply_text(
             "Для просмотра бронирований необходимо зарегистрироваться и пройти верификацию. ❌\n"
             "Используйте команду /start и выберите 'Регистрация'."
@@ -194,25 +330,53 @@ async def apartments_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         reply_markup=reply_markup
     )
 
+def build_application():
+    """Создание приложения бота с обработчиками"""
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(init_api_client)
+        .post_shutdown(close_api_client)
+    )
+    if TELEGRAM_API_URL:
+        # Например, локальный fake_telegram_server.py для интеграционных тестов
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    application = builder.build()
+    
+    # Регистрация обработчиков
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CallbackQueryHandler(view_apartments_handler, pattern=r"^(view_apartments|apartments_page:\d+)$"))
+    application.add_handler(CallbackQueryHandler(register_handler, pattern="^register$"))
+    application.add_handler(CallbackQueryHandler(my_bookings_handler, pattern="^my_bookings$"))
+    application.add_handler(MessageHandler(filters.PHOTO, handle_document_photo))
+    application.add_handler(CommandHandler("apartments", apartments_command))
+    return application
+
 def main():
     """Запуск бота"""
     try:
         logger.info("Запуск бота...")
-        application = Application.builder().token(TELEGRAM_TOKEN).build()
+        application = build_application()
         
-        # Регистрация обработчиков
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CallbackQueryHandler(view_apartments_handler, pattern="^view_apartments$"))
-        application.add_handler(CallbackQueryHandler(register_handler, pattern="^register$"))
-        application.add_handler(CallbackQueryHandler(my_bookings_handler, pattern="^my_bookings$"))
-        application.add_handler(MessageHandler(filters.PHOTO, handle_document_photo))
-        application.add_handler(CommandHandler("apartments", apartments_command))
-        
-        logger.info("Бот успешно настроен и запускается")
+        logger.info(f"Бот успешно настроен и запускается в режиме {BOT_MODE}, типы обновлений: {ALLOWED_UPDATES}")
         # Запуск бота
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if BOT_MODE == 'webhook':
+            if not BOT_WEBHOOK_URL:
+                raise ValueError("BOT_WEBHOOK_URL не установлен")
+            application.run_webhook(
+                listen=BOT_WEBHOOK_LISTEN,
+                port=BOT_WEBHOOK_PORT,
+                url_path=BOT_WEBHOOK_PATH,
+                webhook_url=BOT_WEBHOOK_URL,
+                secret_token=BOT_WEBHOOK_SECRET or None,
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=False
+            )
+        else:
+            application.run_polling(allowed_updates=ALLOWED_UPDATES)
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {str(e)}")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
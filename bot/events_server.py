@@ -0,0 +1,58 @@
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/events'
+
+
+def make_handler(status_cache, secret):
+    class BotEventsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status):
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_POST(self):
+            if self.path.split('?')[0] != EVENTS_PATH:
+                return self._send(404)
+            # Без секрета любой мог бы сбросить кэш статусов - такие запросы не принимаются
+            received = self.headers.get('X-Bot-Events-Secret', '').encode('utf-8', 'surrogateescape')
+            if not secret or not hmac.compare_digest(received, secret.encode('utf-8')):
+                return self._send(403)
+
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                event = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send(400)
+            if not isinstance(event, dict):
+                return self._send(400)
+
+            if event.get('event') == 'verification_changed' and 'telegram_id' in event:
+                try:
+                    telegram_id = int(event['telegram_id'])
+                except (TypeError, ValueError):
+                    return self._send(400)
+                status_cache.apply_change(telegram_id, bool(event.get('is_verified')))
+                logger.info(f"Статус верификации пользователя {telegram_id} обновлен по событию API")
+            self._send(204)
+
+    return BotEventsHandler
+
+
+def start_events_server(status_cache, host, port, secret):
+    """Запустить приемник событий API в фоновом потоке (секрет обязателен)"""
+    if not secret:
+        raise ValueError('BOT_EVENTS_SECRET is not configured')
+    server = ThreadingHTTPServer((host, port), make_handler(status_cache, secret))
+    thread = threading.Thread(target=server.serve_forever, name='bot-events', daemon=True)
+    thread.start()
+    logger.info(f"Приемник событий API слушает {host}:{server.server_address[1]}{EVENTS_PATH}")
+    return server
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Фоновая проверка доступности API с кэшированием результата.
+
+    Задача в цикле событий бота раз в interval секунд запрашивает /healthz,
+    а обработчики читают сохраненное состояние без сетевых запросов.
+    """
+
+    def __init__(self, api_client, interval=None, timeout=None, path='/healthz'):
+        self.api_client = api_client
+        self.interval = interval if interval is not None else float(os.getenv('BOT_HEALTH_INTERVAL', 30))
+        self.timeout = timeout if timeout is not None else float(os.getenv('BOT_HEALTH_TIMEOUT', 3))
+        self.path = path
+        # None - состояние еще не проверялось
+        self.healthy = None
+        self.last_checked = None
+        self.last_error = None
+        self.latency = None
+        self._task = None
+
+    @property
+    def available(self):
+        """API считается доступным, пока проверка не показала обратное"""
+        return self.healthy is not False
+
+    async def check(self):
+        """Одна проверка /healthz; результат сохраняется в состоянии монитора"""
+        started = time.monotonic()
+        try:
+            response = await self.api_client.get(self.path, timeout=self.timeout, retries=0)
+            healthy = response.status_code == 200
+            error = None if healthy else f"HTTP {response.status_code}"
+        except Exception as e:
+            healthy, error = False, str(e) or type(e).__name__
+
+        if healthy != self.healthy:
+            if healthy:
+                logger.info("API доступен")
+            else:
+                logger.warning(f"API недоступен: {error}")
+        self.healthy = healthy
+        self.last_error = error
+        self.latency = time.monotonic() - started
+        self.last_checked = time.time()
+        return healthy
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Запустить фоновые проверки в текущем цикле событий"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self):
+        return {
+            'healthy': self.healthy,
+            'last_checked': self.last_checked,
+            'last_error': self.last_error,
+            'latency': self.latency
+        }
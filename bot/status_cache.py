@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerificationStatusCache:
+    """Кэш статусов верификации пользователей по telegram_id (TTL + LRU).
+
+    Изменения статуса приходят от API через приемник событий
+    (bot/events_server.py), поэтому TTL нужен только как страховка на
+    случай потерянного события. Доступ защищен блокировкой: события
+    обрабатываются в потоке приемника, а чтение идет из цикла событий бота.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize if maxsize is not None else int(os.getenv('BOT_STATUS_CACHE_SIZE', 10000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('BOT_STATUS_CACHE_TTL', 300))
+        self._entries = OrderedDict()  # telegram_id -> (expires_at, status)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id):
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[telegram_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, telegram_id, status):
+        with self._lock:
+            self._entries[telegram_id] = (time.monotonic() + self.ttl, status)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def apply_change(self, telegram_id, is_verified):
+        """Обновить закэшированный статус по событию от API"""
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+        if entry is None:
+            return
+        self.set(telegram_id, dict(entry[1], is_verified=is_verified))
+
+    def invalidate(self, telegram_id=None):
+        with self._lock:
+            if telegram_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(telegram_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
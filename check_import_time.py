@@ -0,0 +1,107 @@
+"""Проверка времени импорта приложения (старт воркера gunicorn).
+
+Импортирует пакет app в чистом процессе с python -X importtime и проверяет:
+    - суммарное время импорта app не превышает бюджет (медиана нескольких запусков);
+    - тяжелые клиенты Google и Telegram не загружаются при импорте
+      (они подключаются лениво, при первом обращении);
+    - импорт не создает каталоги instance/ и logs/ (БД и логи - в startup()).
+
+Запуск:
+    python check_import_time.py
+    IMPORT_TIME_BUDGET_MS=400 python check_import_time.py --runs 5
+
+Код выхода 1 при нарушении любого условия.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_TIME_BUDGET_MS = int(os.getenv('IMPORT_TIME_BUDGET_MS', 500))
+
+# Модули, которые не должны загружаться при импорте приложения
+FORBIDDEN_MODULES = (
+    'googleapiclient',
+    'google.oauth2',
+    'google.auth',
+    'gspread',
+    'telegram',
+    'httpx',
+    'jwt',
+    'requests',
+)
+
+
+def measure_import(workdir):
+    """Время импорта app (мс) и список импортированных модулей из вывода -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=workdir, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONPATH=BASE_DIR)
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Импорт app завершился с ошибкой:\n{result.stderr[-2000:]}")
+
+    total_ms = None
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        module = name.strip()
+        modules.append(module)
+        if module == 'app':
+            total_ms = int(cumulative_us) / 1000
+    if total_ms is None:
+        raise RuntimeError('В выводе -X importtime нет пакета app')
+    return total_ms, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бюджет времени импорта приложения')
+    parser.add_argument('--runs', type=int, default=3, help='Число замеров (берется медиана)')
+    parser.add_argument('--budget', type=int, default=IMPORT_TIME_BUDGET_MS, help='Бюджет, мс')
+    args = parser.parse_args()
+
+    errors = []
+    # Запуск из временного каталога: instance/ и logs/ создаются относительно пакета,
+    # поэтому их появление проверяем в корне проекта
+    created_before = {name for name in ('instance', 'logs') if os.path.exists(os.path.join(BASE_DIR, name))}
+    workdir = tempfile.mkdtemp()
+    try:
+        timings = []
+        modules = []
+        for _ in range(args.runs):
+            total_ms, modules = measure_import(workdir)
+            timings.append(total_ms)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    median_ms = statistics.median(timings)
+    print(f"Импорт app: {median_ms:.0f} мс (замеры: {', '.join(f'{t:.0f}' for t in timings)}), бюджет {args.budget} мс")
+    if median_ms > args.budget:
+        errors.append(f"время импорта {median_ms:.0f} мс превышает бюджет {args.budget} мс")
+
+    loaded = [
+        forbidden for forbidden in FORBIDDEN_MODULES
+        if any(module == forbidden or module.startswith(forbidden + '.') for module in modules)
+    ]
+    if loaded:
+        errors.append(f"при импорте загружены тяжелые модули: {', '.join(loaded)}")
+
+    for name in ('instance', 'logs'):
+        if name not in created_before and os.path.exists(os.path.join(BASE_DIR, name)):
+            errors.append(f"импорт создал каталог {name}/ (должен создаваться в startup())")
+
+    for error in errors:
+        print(f"  Ошибка: {error}")
+    print('OK' if not errors else 'ОШИБКА')
+    sys.exit(0 if not errors else 1)
+
+
+if __name__ == '__main__':
+    main()
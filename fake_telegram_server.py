@@ -0,0 +1,270 @@
+"""Локальный fake-сервер Telegram Bot API для интеграционных проверок бота.
+
+Поддерживает методы, которые использует бот (getMe, setWebhook, deleteWebhook,
+getWebhookInfo, getUpdates, sendMessage, editMessageText, answerCallbackQuery,
+getFile) и скачивание файлов. Обновления добавляются через push_update(): если бот
+установил webhook, обновление отправляется на него (с секретным заголовком и
+учетом allowed_updates), иначе попадает в очередь getUpdates. Отправленные
+ботом сообщения сохраняются в state.sent_messages.
+
+Запуск:
+    python fake_telegram_server.py --port 8090
+    TELEGRAM_API_URL=http://127.0.0.1:8090 TELEGRAM_BOT_TOKEN=123:test python bot/bot.py
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import requests
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Zamok Test Bot', 'username': 'zamok_test_bot'}
+
+
+class FakeTelegramState:
+    """Очередь обновлений, настройки webhook и отправленные ботом сообщения"""
+
+    def __init__(self):
+        self.updates = []
+        self.sent_messages = []
+        self.calls = []
+        self.files = {}
+        self.webhook = None
+        self.webhook_deliveries = 0
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._condition = threading.Condition()
+
+    def push_update(self, update):
+        """Добавить обновление: доставить на webhook или поставить в очередь getUpdates"""
+        with self._condition:
+            update = dict(update, update_id=self._next_update_id)
+            self._next_update_id += 1
+            webhook = self.webhook
+
+        if webhook:
+            if webhook['allowed_updates'] and not any(key in update for key in webhook['allowed_updates']):
+                return update
+            headers = {}
+            if webhook.get('secret_token'):
+                headers['X-Telegram-Bot-Api-Secret-Token'] = webhook['secret_token']
+            response = requests.post(webhook['url'], json=update, headers=headers, timeout=10)
+            response.raise_for_status()
+            self.webhook_deliveries += 1
+            return update
+
+        with self._condition:
+            self.updates.append(update)
+            self._condition.notify_all()
+        return update
+
+    def get_updates(self, offset=None, timeout=0, allowed_updates=None):
+        deadline = time.monotonic() + float(timeout or 0)
+        with self._condition:
+            while True:
+                if offset:
+                    # Как в Bot API: offset подтверждает все предыдущие обновления
+                    self.updates = [u for u in self.updates if u['update_id'] >= offset]
+                pending = [
+                    u for u in self.updates
+                    if not allowed_updates or any(key in u for key in allowed_updates)
+                ]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    return pending
+                self._condition.wait(min(remaining, 1.0))
+
+    def add_message(self, chat_id, text, **extra):
+        with self._condition:
+            message = {
+                'message_id': self._next_message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'private'},
+                'from': BOT_USER,
+                'text': text
+            }
+            self._next_message_id += 1
+            self.sent_messages.append(dict(message, **extra))
+            self._condition.notify_all()
+        return message
+
+    def wait_for_messages(self, count, timeout=10):
+        """Дождаться, пока бот отправит не меньше count сообщений"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self.sent_messages) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return list(self.sent_messages)
+
+
+def make_user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+
+
+def make_message_update(text, user_id=1001):
+    """Обновление с текстовым сообщением (например, командой /start)"""
+    message = {
+        'message_id': int(time.time() * 1000) % 1000000,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': make_user(user_id),
+        'text': text
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'message': message}
+
+
+def make_callback_update(data, user_id=1001):
+    """Обновление с нажатием inline-кнопки"""
+    return {
+        'callback_query': {
+            'id': str(int(time.time() * 1000)),
+            'from': make_user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': 'menu'
+            }
+        }
+    }
+
+
+def _parse_params(handler):
+    length = int(handler.headers.get('Content-Length', 0))
+    body = handler.rfile.read(length) if length else b''
+    content_type = handler.headers.get('Content-Type', '')
+
+    if content_type.startswith('application/json'):
+        return json.loads(body or b'{}')
+
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body
+        )
+        raw = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if part.get_filename():
+                raw[name] = part.get_payload(decode=True)
+            else:
+                raw[name] = part.get_content()
+    else:
+        raw = dict(parse_qsl(body.decode('utf-8')))
+
+    # Bot API клиенты передают сложные значения как JSON-строки
+    params = {}
+    for key, value in raw.items():
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        params[key] = value
+    return params
+
+
+def make_handler(state):
+    class FakeTelegramHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, body, status=200, content_type='application/json'):
+            data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _ok(self, result):
+            self._send({'ok': True, 'result': result})
+
+        def do_GET(self):
+            # /file/bot<token>/<file_path>
+            parts = self.path.split('/', 3)
+            if len(parts) == 4 and parts[1] == 'file' and parts[3] in state.files:
+                return self._send(state.files[parts[3]], content_type='application/octet-stream')
+            self._send({'ok': False, 'error_code': 404, 'description': 'Not Found'}, 404)
+
+        def do_POST(self):
+            # /bot<token>/<method>
+            parts = self.path.split('?')[0].strip('/').split('/')
+            if len(parts) != 2 or not parts[0].startswith('bot'):
+                return self._send({'ok': False, 'error_code': 404, 'description': 'Not Found'}, 404)
+            method = parts[1]
+            params = _parse_params(self)
+            state.calls.append((method, params))
+
+            if method == 'getMe':
+                return self._ok(BOT_USER)
+            if method == 'setWebhook':
+                state.webhook = {
+                    'url': params['url'],
+                    'secret_token': params.get('secret_token'),
+                    'allowed_updates': params.get('allowed_updates') or []
+                }
+                return self._ok(True)
+            if method == 'deleteWebhook':
+                state.webhook = None
+                return self._ok(True)
+            if method == 'getWebhookInfo':
+                webhook = state.webhook or {}
+                return self._ok({
+                    'url': webhook.get('url', ''),
+                    'has_custom_certificate': False,
+                    'pending_update_count': len(state.updates),
+                    'allowed_updates': webhook.get('allowed_updates', [])
+                })
+            if method == 'getUpdates':
+                return self._ok(state.get_updates(
+                    params.get('offset'), min(float(params.get('timeout') or 0), 5), params.get('allowed_updates')
+                ))
+            if method == 'sendMessage':
+                return self._ok(state.add_message(params['chat_id'], params.get('text', ''),
+                                                  reply_markup=params.get('reply_markup')))
+            if method == 'editMessageText':
+                return self._ok(state.add_message(params['chat_id'], params.get('text', ''),
+                                                  reply_markup=params.get('reply_markup'), edited=True))
+            if method == 'answerCallbackQuery':
+                return self._ok(True)
+            if method == 'getFile':
+                file_id = params['file_id']
+                return self._ok({'file_id': file_id, 'file_unique_id': file_id, 'file_path': f'photos/{file_id}.jpg'})
+            self._send({'ok': False, 'error_code': 400, 'description': f'Method {method} is not supported'}, 400)
+
+    return FakeTelegramHandler
+
+
+def start_fake_server(port=0):
+    """Запустить fake-сервер в фоновом потоке; возвращает (server, state, base_url)"""
+    state = FakeTelegramState()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, state, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake-сервер Telegram Bot API')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+
+    server, state, base_url = start_fake_server(args.port)
+    print(f"Fake Telegram Bot API: {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
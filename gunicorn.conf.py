@@ -0,0 +1,63 @@
+"""Конфигурация gunicorn для продакшн-запуска API.
+
+Gunicorn подхватывает этот файл автоматически при запуске из корня проекта:
+    gunicorn app:app
+    GUNICORN_WORKER_CLASS=sync gunicorn app:app
+
+Все параметры задаются переменными окружения (см. .env.example).
+Классы воркеров:
+    sync    - процесс на запрос, воркеров 2 * ядра + 1;
+    gthread - потоки внутри процесса (по умолчанию): ввод-вывод SQLite,
+              Airtable и Google не блокирует весь воркер, память экономится;
+    gevent  - кооперативная многозадачность, нужен пакет gevent.
+"""
+import importlib.util
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Логгер gunicorn доступен только в хуках; предупреждение пишется в on_starting
+gevent_missing = worker_class == 'gevent' and importlib.util.find_spec('gevent') is None
+if gevent_missing:
+    worker_class = 'gthread'
+
+# Воркеров по умолчанию: процессам sync нужен запас на ожидание ввода-вывода,
+# gthread и gevent ждут ввод-вывод внутри процесса
+default_workers = cores * 2 + 1 if worker_class == 'sync' else cores + 1
+workers = int(os.getenv('GUNICORN_WORKERS', default_workers))
+threads = int(os.getenv('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+# Приложение импортируется один раз в мастер-процессе до fork: воркеры
+# стартуют быстрее и делят память. Пул соединений SQLite и клиенты Google
+# пересоздаются в воркере по смене pid, outbox запускается при первом запросе.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Перезапуск воркера после N запросов (от утечек памяти); jitter, чтобы
+# воркеры не перезапускались одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    if gevent_missing:
+        server.log.warning('gevent не установлен, используем gthread')
+    server.log.info(
+        f"Профиль gunicorn: {worker_class}, воркеров {workers}, потоков {threads}, preload {preload_app}"
+    )
+    # Миграции схемы и логирование - один раз в мастер-процессе, до запуска воркеров
+    from app import startup
+    startup()
+
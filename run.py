@@ -1,4 +1,4 @@
-from app import app
+from app import app, startup
 from ngrok_config import start_ngrok
 import os
 import sys
@@ -18,5 +18,8 @@ if __name__ == '__main__':
             print(f" * Ошибка при запуске NGROK: {str(e)}", file=sys.stderr)
             print(" * Продолжаем без NGROK...", file=sys.stderr)
     
-    # Запускаем Flask приложение
-    app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
+    # Логирование и схема БД
+    startup()
+    
+    # Запускаем встроенный сервер Flask (для разработки; в продакшне - gunicorn -c gunicorn.conf.py app:app)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=app.config['DEBUG']) 
\ No newline at end of file
@@ -13,16 +13,22 @@ load_dotenv()
 flask_running = True
 bot_running = True
 
+# Сервер API: gunicorn (продакшн, настройки в gunicorn.conf.py) или встроенный сервер Flask (APP_SERVER=dev)
+if os.getenv("APP_SERVER", "gunicorn") == "dev":
+    FLASK_COMMAND = ["python", "run.py"]
+else:
+    FLASK_COMMAND = ["gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+
 # Функция для запуска Flask-сервера
 def run_flask():
     print("Запуск Flask-сервера...")
-    flask_process = subprocess.Popen(["python", "run.py"])
+    flask_process = subprocess.Popen(FLASK_COMMAND)
     
     while flask_running:
         # Проверяем, что процесс все еще работает
         if flask_process.poll() is not None:
             print("Flask-сервер неожиданно остановился. Перезапуск...")
-            flask_process = subprocess.Popen(["python", "run.py"])
+            flask_process = subprocess.Popen(FLASK_COMMAND)
         time.sleep(2)
     
     # Завершаем процесс при выходе
@@ -0,0 +1,106 @@
+"""Проверка входа и регистрации: Telegram ID принимается только из подписанной
+initData Mini App или от бота с общим секретом BOT_API_SECRET.
+
+Запускает приложение на временной БД (удаляется после проверки вместе с
+логами) с тестовым токеном бота и проверяет, что Telegram ID, переданный
+напрямую или в поддельной initData, не дает токена даже для владельца-админа,
+а регистрация не может занять Telegram ID существующего владельца:
+    python test_auth.py
+
+Код выхода 1, если хотя бы одна проверка не прошла.
+"""
+import hmac
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+from urllib.parse import urlencode
+
+TEST_BOT_TOKEN = '123456:test-bot-token'
+TEST_BOT_API_SECRET = 'test-bot-api-secret'
+ADMIN_TELEGRAM_ID = 900001
+
+
+def signed_init_data(telegram_id, bot_token=TEST_BOT_TOKEN):
+    """initData Mini App, подписанная так же, как это делает Telegram"""
+    from app.telegram_webapp import webapp_secret
+
+    fields = {
+        'auth_date': str(int(time.time())),
+        'user': json.dumps({'id': telegram_id, 'first_name': 'Тест'}, separators=(',', ':')),
+    }
+    data_check_string = '\n'.join(f'{key}={fields[key]}' for key in sorted(fields))
+    fields['hash'] = hmac.digest(webapp_secret(bot_token), data_check_string.encode('utf-8'), 'sha256').hex()
+    return urlencode(fields)
+
+
+def run_checks():
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app, startup
+    from app.database import Owner
+
+    startup()
+    Owner.create(ADMIN_TELEGRAM_ID, username='admin', is_verified=True)
+    client = app.test_client()
+
+    def login(body):
+        return client.post('/api/auth/login', json=body).status_code
+
+    def register(telegram_id=None, init_data=None, bot_secret=None):
+        form = {'document_photo': (BytesIO(b'photo'), 'document.jpg', 'image/jpeg')}
+        if telegram_id is not None:
+            form['telegram_id'] = str(telegram_id)
+        if init_data is not None:
+            form['init_data'] = init_data
+        headers = {'X-Bot-Api-Secret': bot_secret} if bot_secret is not None else {}
+        return client.post('/api/auth/register', data=form, headers=headers).status_code
+
+    return [
+        ('вход по telegram_id без initData', login({'telegram_id': ADMIN_TELEGRAM_ID}), 400),
+        ('вход по initData, подписанной чужим токеном',
+         login({'init_data': signed_init_data(ADMIN_TELEGRAM_ID, '654321:other-token')}), 401),
+        ('telegram_id рядом с поддельной initData',
+         login({'telegram_id': ADMIN_TELEGRAM_ID, 'init_data': 'user=%7B%22id%22%3A900001%7D&hash=00'}), 401),
+        ('вход по подписанной initData', login({'init_data': signed_init_data(ADMIN_TELEGRAM_ID)}), 200),
+        ('регистрация по telegram_id без секрета бота', register(900002), 401),
+        ('регистрация с неверным секретом бота', register(900002, bot_secret='wrong'), 401),
+        ('регистрация на Telegram ID владельца', register(ADMIN_TELEGRAM_ID, bot_secret=TEST_BOT_API_SECRET), 409),
+        ('регистрация от бота', register(900002, bot_secret=TEST_BOT_API_SECRET), 202),
+        ('повторная регистрация', register(900002, bot_secret=TEST_BOT_API_SECRET), 409),
+        ('регистрация по подписанной initData', register(init_data=signed_init_data(900003)), 202),
+    ]
+
+
+def main():
+    # Настройки читаются при импорте app
+    tmp_dir = tempfile.mkdtemp(prefix='zamok-auth-')
+    os.environ.update(
+        DB_PATH=os.path.join(tmp_dir, 'zamok.db'),
+        LOG_DIR=tmp_dir,
+        SECRET_KEY='test-auth-secret-key-0123456789abcdef',
+        OUTBOX_ENABLED='false',
+        TELEGRAM_BOT_TOKEN=TEST_BOT_TOKEN,
+        BOT_API_SECRET=TEST_BOT_API_SECRET,
+        UPLOAD_SPOOL_DIR=os.path.join(tmp_dir, 'uploads'),
+        ADMIN_TELEGRAM_IDS=str(ADMIN_TELEGRAM_ID),
+    )
+    try:
+        results = run_checks()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    failed = 0
+    for name, status, expected in results:
+        ok = status == expected
+        failed += 0 if ok else 1
+        print(f"{'OK' if ok else 'ОШИБКА'}: {name}: {status} (ожидается {expected})")
+    print('OK' if not failed else f'ОШИБКА: не прошло проверок - {failed}')
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Нагрузочная проверка бронирований одной квартиры на пересечения.
+
+Сотни параллельных запросов /api/bookings/create на случайные пересекающиеся
+даты одной квартиры. После прогона в БД не должно быть ни одной пары активных
+бронирований с общими ночами, а каждый отказ должен быть ответом 409.
+
+По умолчанию запускает несколько процессов с приложением (как воркеры
+gunicorn) на общей временной БД, которая удаляется после проверки вместе с
+логами; доставка outbox (Airtable и др.) в этом режиме отключена:
+    python test_booking_concurrency.py --workers 4 --requests 400
+
+Проверка работающего сервера (БД читается для проверки результата):
+    python test_booking_concurrency.py --url http://127.0.0.1:5000 --apartment-id 1
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'zamok.db')
+
+
+def make_bookings(count, seed, days=60, max_nights=5):
+    """Случайные даты в ближайшие days дней: при малом окне большинство пересекается"""
+    rng = random.Random(seed)
+    first_day = date.today() + timedelta(days=1)
+    bookings = []
+    for number in range(count):
+        check_in = first_day + timedelta(days=rng.randrange(days))
+        check_out = check_in + timedelta(days=rng.randint(1, max_nights))
+        bookings.append((number, check_in.isoformat(), check_out.isoformat()))
+    return bookings
+
+
+def booking_payload(apartment_id, number, check_in, check_out):
+    return {
+        'apartment_id': apartment_id,
+        'check_in_date': check_in,
+        'check_out_date': check_out,
+        'total_price': 1,
+        'user_name': f'Нагрузочный тест {number}'
+    }
+
+
+def run_worker(apartment_id, bookings, threads):
+    """Процесс-воркер: свой экземпляр приложения и пул потоков, как воркер gunicorn"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import app, startup
+    startup()
+
+    def send(booking):
+        with app.test_client() as client:
+            response = client.post('/api/bookings/create', json=booking_payload(apartment_id, *booking))
+            return response.status_code
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(send, bookings))
+
+
+def run_local(args, bookings):
+    # Настройки читаются при импорте app и наследуются процессами-воркерами
+    os.environ['DB_PATH'] = args.db
+    os.environ['LOG_DIR'] = os.path.dirname(args.db)
+    os.environ['OUTBOX_ENABLED'] = 'false'
+    os.environ['TELEGRAM_WEBAPP_AUTH_REQUIRED'] = 'false'
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import startup
+    from app.database import Apartment
+
+    # БД и миграции - до запуска воркеров
+    startup()
+
+    apartment_id = args.apartment_id or Apartment.create(
+        'Квартира для нагрузочного теста', 'Тестовая улица, 1', 2500
+    )
+    print(f"Квартира: {apartment_id}, процессов: {args.workers}, потоков на процесс: {args.threads}")
+
+    chunks = [bookings[index::args.workers] for index in range(args.workers)]
+    # spawn: каждый воркер открывает свои соединения с БД, как отдельный процесс gunicorn
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(args.workers) as pool:
+        results = pool.starmap(run_worker, [(apartment_id, chunk, args.threads) for chunk in chunks])
+    return apartment_id, [status for chunk in results for status in chunk]
+
+
+def run_remote(args, bookings):
+    import requests
+
+    if not args.apartment_id:
+        sys.exit('Для проверки сервера укажите --apartment-id')
+    url = args.url.rstrip('/') + '/api/bookings/create'
+    print(f"Сервер: {args.url}, квартира: {args.apartment_id}, потоков: {args.threads}")
+
+    def send(booking):
+        response = requests.post(url, json=booking_payload(args.apartment_id, *booking), timeout=30)
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        return args.apartment_id, list(executor.map(send, bookings))
+
+
+def find_overlaps(db_path, apartment_id):
+    """Пары активных бронирований квартиры с общими ночами"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT id, date(check_in_date), date(check_out_date) FROM bookings "
+        "WHERE apartment_id = ? AND status != 'cancelled' ORDER BY date(check_in_date), id",
+        (apartment_id,)
+    ).fetchall()
+    conn.close()
+
+    overlaps = []
+    latest = None  # бронирование с самым поздним выездом среди просмотренных
+    for row in rows:
+        if latest is not None and row[1] < latest[2]:
+            overlaps.append((latest, row))
+        if latest is None or row[2] > latest[2]:
+            latest = row
+    return rows, overlaps
+
+
+def count_users(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Параллельные бронирования одной квартиры')
+    parser.add_argument('--requests', type=int, default=400, help='Число запросов на бронирование')
+    parser.add_argument('--workers', type=int, default=4, help='Число процессов приложения (локальный режим)')
+    parser.add_argument('--threads', type=int, default=16, help='Потоков на процесс')
+    parser.add_argument('--url', help='Адрес работающего сервера вместо локальных процессов')
+    parser.add_argument('--apartment-id', type=int, help='Квартира (по умолчанию создается новая)')
+    parser.add_argument('--db', help='Путь к БД сервера для проверки результата (режим --url)')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    bookings = make_bookings(args.requests, args.seed)
+    tmp_dir = None
+    started = time.perf_counter()
+    if args.url:
+        args.db = args.db or DEFAULT_DB_PATH
+        apartment_id, statuses = run_remote(args, bookings)
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='zamok-concurrency-')
+        args.db = os.path.join(tmp_dir, 'zamok.db')
+        apartment_id, statuses = run_local(args, bookings)
+    elapsed = time.perf_counter() - started
+
+    created = statuses.count(200)
+    conflicts = statuses.count(409)
+    errors = len(statuses) - created - conflicts
+    rows, overlaps = find_overlaps(args.db, apartment_id)
+    users = count_users(args.db)
+    if tmp_dir:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Запросов: {len(statuses)} за {elapsed:.2f} с ({len(statuses) / elapsed:.0f} в секунду)")
+    print(f"Создано: {created}, отказов 409: {conflicts}, других ответов: {errors}")
+    print(f"Активных бронирований квартиры в БД: {len(rows)}, пересечений: {len(overlaps)}")
+    for first, second in overlaps[:10]:
+        print(f"  Пересечение: {first} и {second}")
+    if tmp_dir:
+        print(f"Пользователей в БД: {users} (отказы не должны создавать гостей)")
+
+    ok = not overlaps and errors == 0 and (args.apartment_id or created == len(rows))
+    # На временной БД каждый гость создан успешным бронированием
+    ok = ok and (not tmp_dir or users == created)
+    print('OK' if ok else 'ОШИБКА')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
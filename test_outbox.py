@@ -0,0 +1,104 @@
+"""Проверка доставки пачек outbox: деление не доставленной пачки пополам.
+
+Запускает outbox на временной БД (удаляется после проверки вместе с логами)
+с тестовым пакетным обработчиком и проверяет, что:
+    - два плохих сообщения в разных половинах пачки не мешают доставить остальные;
+    - при недоступности сервиса пачка не делится и целиком уходит на повтор;
+    - ответ 4xx Airtable делит пачку, а 503 считается недоступностью.
+    python test_outbox.py
+
+Код выхода 1, если хотя бы одна проверка не прошла.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+BATCH_SIZE = 10
+
+
+def run_scenario(name, bad_numbers, error_factory):
+    """Пачка из BATCH_SIZE сообщений; обработчик отклоняет пачку, если в ней есть плохой номер.
+
+    Возвращает (доставлено, отложено на повтор, вызовов обработчика).
+    """
+    from app import get_pooled_connection
+    from app import outbox
+
+    target = f'test_{name}'
+    calls = []
+
+    def handler(messages):
+        calls.append(len(messages))
+        bad = [payload['number'] for payload, _ in messages if payload['number'] in bad_numbers]
+        if bad:
+            raise error_factory(bad)
+
+    outbox.register_handler(target, handler, batch_size=BATCH_SIZE)
+    with get_pooled_connection() as conn:
+        for number in range(BATCH_SIZE):
+            outbox.enqueue(conn, target, {'number': number}, f'{target}:{number}')
+        conn.commit()
+
+    outbox.dispatcher.dispatch_once()
+
+    with get_pooled_connection() as conn:
+        counts = dict(conn.execute(
+            'SELECT status, COUNT(*) FROM outbox WHERE target = ? GROUP BY status', (target,)
+        ).fetchall())
+    return counts.get(outbox.STATUS_DONE, 0), counts.get(outbox.STATUS_PENDING, 0), len(calls)
+
+
+def run_checks():
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app import startup
+    from app.airtable_integration import AirtableError
+
+    startup()
+
+    def invalid(bad):
+        return AirtableError(f"Airtable вернул 422: плохие записи {bad}", 422)
+
+    def unavailable(bad):
+        return ConnectionError('сервис недоступен')
+
+    def server_error(bad):
+        return AirtableError('Airtable вернул 503', 503)
+
+    return [
+        # 10 -> 5 + 5 -> (2 + 3) + (2 + 3) -> ...: доставлены все, кроме сообщений 1 и 7
+        ('два плохих сообщения в разных половинах', run_scenario('split', {1, 7}, invalid), (8, 2)),
+        ('сервис недоступен', run_scenario('outage', set(range(BATCH_SIZE)), unavailable), (0, BATCH_SIZE, 1)),
+        ('Airtable 503', run_scenario('server_error', set(range(BATCH_SIZE)), server_error), (0, BATCH_SIZE, 1)),
+    ]
+
+
+def main():
+    # Настройки читаются при импорте app
+    tmp_dir = tempfile.mkdtemp(prefix='zamok-outbox-')
+    os.environ.update(
+        DB_PATH=os.path.join(tmp_dir, 'zamok.db'),
+        LOG_DIR=tmp_dir,
+        OUTBOX_ENABLED='false',
+    )
+    try:
+        results = run_checks()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    failed = 0
+    for name, (done, pending, calls), expected in results:
+        actual = (done, pending, calls)[:len(expected)]
+        ok = actual == expected
+        failed += 0 if ok else 1
+        print(
+            f"{'OK' if ok else 'ОШИБКА'}: {name}: доставлено {done}, на повтор {pending}, "
+            f"вызовов обработчика {calls} (ожидается {expected})"
+        )
+    print('OK' if not failed else f'ОШИБКА: не прошло проверок - {failed}')
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == '__main__':
+    main()